@@ -0,0 +1,247 @@
+"""
+Async read endpoints of the API, for ASGI servers.
+
+DRF views are synchronous, so these are plain Django async views that read
+through the async ORM and return the same JSON as their sync twins in
+``api.views``, whose configuration (queryset, serializer, pagination) they
+reuse. With ``API_ASYNC_READS`` on (the default in ``project/asgi.py``),
+``api.urls`` serves the ``GET`` of each resource from here and sends every
+other method to the sync view, so writes keep their DRF authentication,
+permissions and validation.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from api import views
+from api.cache import cache_response
+from api.conditional import conditional, detail_state, list_state
+from api.paginations import KeysetResultPagination
+from api.querysets import eager_load, ordering_fields
+from api.serializers import DirectorSerializer, GenreSerializer, MovieSerializer, sparse_options
+from api.values import ValuesSerializer
+from api.views import DIRECTOR_MODELS, GENRE_MODELS, MOVIE_MODELS
+from apps.models import Director, Genre, Movie
+from apps.paginations import MOVIE_ORDERINGS, page_size
+
+
+def api_read(view):
+    """
+    Run an async read view on a DRF ``Request`` and render its ``Response``,
+    or the error it raised, as JSON like ``@api_view`` does. Credentials are
+    checked up front by the default authentication classes, so bad ones get
+    the same 401 as on the sync views. The rendering happens here since Django
+    renders a deferred response in a worker thread.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request, authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            await sync_to_async(perform_authentication)(request)
+            response = await view(request, *args, **kwargs)
+        except Exception as exc:
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # like APIView.handle_exception: 401 with a challenge, else 403
+                header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+                if header:
+                    exc.auth_header = header
+                else:
+                    exc.status_code = 403
+            response = exception_handler(exc, {'request': request, 'args': args, 'kwargs': kwargs})
+            if response is None:
+                raise
+        if not isinstance(response, Response):
+            return response
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = JSONRenderer.media_type
+        response.renderer_context = {'request': request, 'response': response}
+        response.render()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+    return wrapper
+
+
+def perform_authentication(request):
+    request.user
+
+
+def read_or_write(read, write):
+    """One URL: ``GET``/``HEAD`` go to the async ``read`` view, other methods to the sync ``write`` one."""
+    write_async = sync_to_async(write)
+    allow = ', '.join(write.cls().allowed_methods) if hasattr(write, 'cls') else None
+
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await write_async(request, *args, **kwargs)
+        response = await read(request, *args, **kwargs)
+        if allow:
+            response['Allow'] = allow
+        return response
+    # like DRF views: session authenticated writes enforce CSRF themselves
+    view.csrf_exempt = True
+    return view
+
+
+async def aget_item(queryset, id):
+    try:
+        return await queryset.aget(id=id)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+async def aget_page(paginator, number):
+    """``paginator.get_page(number)``, counted and read through the async ORM."""
+    paginator.count = await paginator.object_list.acount()
+    page = paginator.get_page(number)
+    page.object_list = [item async for item in page.object_list]
+    return page
+
+
+async def keyset_response(request, queryset, serializer_class, orderings=None, context=None):
+    pagination = KeysetResultPagination()
+    pagination.page_size_query_param = 'limit'
+    if orderings is not None:
+        pagination.orderings = orderings
+    items = await pagination.apaginate_queryset(queryset, request)
+    if isinstance(serializer_class, ValuesSerializer):
+        data = await serializer_class.arender(items)
+    else:
+        data = serializer_class(instance=items, many=True, context=context or {}).data
+    return Response({
+        'limit': pagination.get_page_size(request),
+        'next': pagination.get_next_link(),
+        'previous': pagination.get_previous_link(),
+        'data': data,
+    })
+
+
+async def offset_response(request, queryset, default_limit, render):
+    limit = page_size(request.GET.get('limit'), default_limit)
+    offset = request.GET.get('offset', 1)
+    paginator = Paginator(queryset, limit)
+    page = await aget_page(paginator, offset)
+    return Response({
+        'count': paginator.count,
+        'limit': limit,
+        'offset': page.number,
+        'page_count': paginator.num_pages,
+        'data': await render(page),
+    })
+
+
+def render_with(serializer_class):
+    async def render(page):
+        return serializer_class(instance=page, many=True).data
+    return render
+
+
+# twins of the function views
+
+@api_read
+@conditional(list_state(*MOVIE_MODELS))
+@cache_response(*MOVIE_MODELS)
+async def list_movies(request):
+    serializer = ValuesSerializer(MovieSerializer(context={'request': request}, **sparse_options(request)))
+    movies = serializer.values(Movie.objects.all(), ordering_fields(MOVIE_ORDERINGS))
+    if 'cursor' in request.GET:
+        return await keyset_response(request, movies, serializer, MOVIE_ORDERINGS)
+    return await offset_response(request, movies, 2, serializer.arender)
+
+
+@api_read
+@conditional(detail_state(Movie, 'director', 'genres'))
+@cache_response(*MOVIE_MODELS)
+async def detail_movies(request, id):
+    options = sparse_options(request)
+    movie = await aget_item(eager_load(Movie.objects.all(), MovieSerializer(**options)), id)
+    serializer = MovieSerializer(instance=movie, many=False, context={'request': request}, **options)
+    return Response(serializer.data)
+
+
+@api_read
+@conditional(list_state(*GENRE_MODELS))
+@cache_response(*GENRE_MODELS)
+async def list_genres(request):
+    genres = Genre.objects.all()
+    if 'cursor' in request.GET:
+        return await keyset_response(request, genres, GenreSerializer)
+    return await offset_response(request, genres, 6, render_with(GenreSerializer))
+
+
+@api_read
+@conditional(list_state(*DIRECTOR_MODELS))
+@cache_response(*DIRECTOR_MODELS)
+async def list_directors(request):
+    directors = Director.objects.all()
+    if 'cursor' in request.GET:
+        return await keyset_response(request, directors, DirectorSerializer)
+    return await offset_response(request, directors, 2, render_with(DirectorSerializer))
+
+
+# GETs of the generic views
+
+@api_read
+@conditional(list_state(*GENRE_MODELS))
+@cache_response(*GENRE_MODELS)
+async def genres(request):
+    view = views.GenresGenericAPILIST
+    items = [genre async for genre in view.queryset.all()]
+    return Response(view.serializer_class(items, many=True).data)
+
+
+@api_read
+@conditional(detail_state(Genre))
+@cache_response(*GENRE_MODELS)
+async def genre(request, id):
+    view = views.DetailGenreGenericAPIView
+    return Response(view.serializer_class(instance=await aget_item(view.queryset.all(), id)).data)
+
+
+@api_read
+@conditional(list_state(*DIRECTOR_MODELS))
+@cache_response(*DIRECTOR_MODELS)
+async def directors(request):
+    view = views.DirectorsGenericAPIView
+    pagination = view.pagination_class()
+    page = await pagination.apaginate_queryset(view.queryset.all(), request, view)
+    return pagination.get_paginated_response(view.serializer_class(page, many=True).data)
+
+
+@api_read
+@conditional(detail_state(Director))
+@cache_response(*DIRECTOR_MODELS)
+async def director(request, id):
+    view = views.DetailDirectorGenericAPIView
+    return Response(view.serializer_class(instance=await aget_item(view.queryset.all(), id)).data)
+
+
+@api_read
+@conditional(list_state(*MOVIE_MODELS))
+@cache_response(*MOVIE_MODELS)
+async def movies(request):
+    view = views.MoviesGenericAPIView
+    serializer = ValuesSerializer(view.serializer_class(**sparse_options(request)))
+    rows = serializer.values(view.queryset.all(), ordering_fields(view.keyset_orderings))
+    pagination = view.pagination_class()
+    page = await pagination.apaginate_queryset(rows, request, view)
+    return pagination.get_paginated_response(await serializer.arender(page))
+
+
+@api_read
+@conditional(detail_state(Movie, 'director', 'genres'))
+@cache_response(*MOVIE_MODELS)
+async def movie(request, id):
+    view = views.DetailMovieGenericAPIView
+    options = sparse_options(request)
+    movie = await aget_item(eager_load(view.queryset.all(), view.serializer_class(**options)), id)
+    return Response(view.serializer_class(instance=movie, **options).data)
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('login/', views.LoginGenericAPIView.as_view()),
     path('register/', views.RegisterGenericAPIView.as_view()),
+    path('token/rotate/', views.RotateTokenGenericAPIView.as_view()),
     # path('djoser/', include('djoser.urls')),
     # re_path(r'^djoser/', include('djoser.urls.authtoken')),
 ]
@@ -1,6 +1,7 @@
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
 
@@ -40,4 +41,12 @@ class RegisterGenericAPIView(GenericAPIView):
         return Response({
             **user_serializer.data,
             'token': token.key,
-        })
\ No newline at end of file
+        })
+
+class RotateTokenGenericAPIView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        Token.objects.filter(user=request.user).delete()
+        token = Token.objects.create(user=request.user)
+        return Response({'token': token.key})
@@ -0,0 +1,160 @@
+"""
+API authentication that remembers successful credential checks.
+
+``CachedBasicAuthentication`` stores the user id of a verified username and
+password for ``BASIC_TTL`` seconds in a shared cache, under an HMAC of the
+credentials keyed with ``SECRET_KEY``, so repeated calls skip the password
+hasher. ``CachedTokenAuthentication`` keeps token keys and their users in a
+local LRU for ``TOKEN_TTL`` seconds, so repeated calls skip the database.
+
+Every entry carries the user's credentials version (a counter in the shared
+cache, like ``apps.versions``) and a fingerprint of the password hash;
+``apps.signals`` bumps the version on logout, on every save of the user (e.g.
+an admin deactivating them) and when a token is rotated or deleted, and a
+changed password no longer matches the fingerprint, so none of these wait for
+the TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+
+from apps.metrics import registry
+
+
+DEFAULTS = {
+    'ALIAS': 'default',  # shared by the workers, holds Basic entries and versions
+    'BASIC_TTL': 60,
+    'TOKEN_TTL': 60,
+    'TOKEN_CACHE_SIZE': 10000,
+}
+
+lookups = registry.counter('api_auth_cache_lookups_total', 'Cached API credential checks by scheme and result',
+                           labels=('scheme', 'result'))
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'API_AUTH_CACHE', {})}
+
+
+def _cache():
+    return caches[get_config()['ALIAS']]
+
+
+def _digest(salt, value):
+    return salted_hmac(f'api.authentication.{salt}', value, algorithm='sha256').hexdigest()
+
+
+def version_key(user_id):
+    return f'auth_version:{user_id}'
+
+
+def get_user_version(user_id):
+    cache = _cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so an evicted counter never reuses an old value
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_user(user_id):
+    """Drop every cached credential of the user, in all workers sharing the cache."""
+    cache = _cache()
+    key = version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def password_fingerprint(user):
+    return _digest('password', user.password)
+
+
+class TokenCache:
+    """Thread-safe LRU of token key -> (token, credentials version, expiry)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, token, version):
+        config = get_config()
+        with self.lock:
+            self.entries[key] = (token, version, time.monotonic() + config['TOKEN_TTL'])
+            self.entries.move_to_end(key)
+            while len(self.entries) > config['TOKEN_CACHE_SIZE']:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+tokens = TokenCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+
+    def authenticate_credentials(self, userid, password, request=None):
+        config = get_config()
+        if not config['BASIC_TTL']:
+            return super().authenticate_credentials(userid, password, request)
+        cache = _cache()
+        key = f'auth_basic:{_digest("basic", f"{userid}:{password}")}'
+        cached = cache.get(key)
+        if cached is not None:
+            user_id, version, fingerprint = cached
+            user = get_user_model()._default_manager.filter(pk=user_id).first()
+            if (user is not None and user.is_active and version == get_user_version(user_id)
+                    and constant_time_compare(fingerprint, password_fingerprint(user))):
+                lookups.inc(scheme='basic', result='hit')
+                return (user, None)
+            cache.delete(key)
+        lookups.inc(scheme='basic', result='miss')
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(key, (user.pk, get_user_version(user.pk), password_fingerprint(user)), config['BASIC_TTL'])
+        return user, auth
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        if not get_config()['TOKEN_TTL']:
+            return super().authenticate_credentials(key)
+        cached = tokens.get(key)
+        if cached is not None:
+            token, version, _ = cached
+            if version == get_user_version(token.user_id) and token.user.is_active:
+                lookups.inc(scheme='token', result='hit')
+                # a copy per request, views may change their user
+                return (copy.copy(token.user), token)
+            tokens.discard(key)
+        lookups.inc(scheme='token', result='miss')
+        user, token = super().authenticate_credentials(key)
+        tokens.set(key, token, get_user_version(token.user_id))
+        return (copy.copy(user), token)
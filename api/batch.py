@@ -0,0 +1,270 @@
+"""
+Batch write endpoints.
+
+``POST`` creates a list of objects, ``PATCH`` updates a list of ``{"id": ...}``
+items and ``DELETE`` removes ``{"ids": [...]}``. A batch is validated as a
+whole and written in one transaction with bulk queries: either every item is
+applied or none is, and the response lists the outcome of each item. Objects
+the user may not change (``writable``) are reported as forbidden.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from api.serializers import BatchDeleteSerializer, BatchMovieSerializer, DirectorSerializer, GenreSerializer
+from apps import counts, search
+from apps.models import Movie, Genre, Director
+from apps.storage import poster_storage
+from apps.versions import bump_version
+
+
+POSTER_FIELDS = ('image', 'inner_image')
+
+
+def get_max_batch_size():
+    return getattr(settings, 'API_BATCH_MAX_SIZE', 500)
+
+
+class BatchAPIView(GenericAPIView):
+    permission_classes = (IsAuthenticated, )
+    # models whose caches a write to this resource invalidates
+    version_models = ()
+
+    def check_batch(self, items):
+        if not isinstance(items, list) or not items:
+            return Response({'message': 'Expected a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > get_max_batch_size():
+            return Response({'message': f'At most {get_max_batch_size()} items per batch'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def writable(self, queryset):
+        """The part of ``queryset`` the user may update and delete."""
+        return queryset
+
+    def invalid(self, errors, forbidden=()):
+        return Response({'results': [
+            {'index': index, 'status': 'forbidden' if index in forbidden else 'invalid', 'errors': item_errors}
+            if item_errors else {'index': index, 'status': 'valid'}
+            for index, item_errors in enumerate(errors)
+        ]}, status=status.HTTP_400_BAD_REQUEST)
+
+    def written(self, ids):
+        for model in self.version_models:
+            bump_version(model)
+
+    def validate_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return None, serializer.errors
+        return serializer.validated_data, self.check_references(serializer.validated_data)
+
+    def check_references(self, validated):
+        """Per-item errors of checks that need the whole batch, ``None`` if all pass."""
+        return None
+
+    def bulk_create(self, validated):
+        model = self.get_queryset().model
+        return model.objects.bulk_create([model(**data) for data in validated])
+
+    def bulk_update(self, objects, items):
+        model = self.get_queryset().model
+        fields = set()
+        for obj, data in zip(objects, items):
+            for field, value in data.items():
+                setattr(obj, field, value)
+                fields.add(field)
+        if fields:
+            model.objects.bulk_update(objects, fields)
+
+    def post(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+        validated, errors = self.validate_create(request.data)
+        if errors:
+            return self.invalid(errors)
+        try:
+            with transaction.atomic():
+                objects = self.bulk_create(validated)
+                self.written([obj.id for obj in objects])
+        except IntegrityError as e:
+            return Response({'message': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': [
+            {'index': index, 'status': 'created', 'id': obj.id} for index, obj in enumerate(objects)
+        ]}, status=status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+        ids = [item.get('id') if isinstance(item, dict) else None for item in request.data]
+        queryset = self.get_queryset().filter(id__in=[id for id in ids if isinstance(id, int)])
+        objects = self.writable(queryset).in_bulk()
+        forbidden = set(queryset.values_list('id', flat=True)) - set(objects)
+        errors = []
+        validated = []
+        for id, item in zip(ids, request.data):
+            if id in forbidden:
+                errors.append({'id': ['You do not have permission to change this object']})
+                validated.append(None)
+                continue
+            if not isinstance(id, int) or id not in objects:
+                errors.append({'id': ['Not found']})
+                validated.append(None)
+                continue
+            serializer = self.get_serializer(instance=objects[id], data=item, partial=True)
+            errors.append(None if serializer.is_valid() else serializer.errors)
+            validated.append(serializer.validated_data if not errors[-1] else None)
+        if len(set(ids)) != len(ids):
+            errors = [error or ({'id': ['Duplicated in batch']} if ids.count(id) > 1 else None)
+                      for id, error in zip(ids, errors)]
+        if not any(errors):
+            errors = self.check_references(validated) or errors
+        if any(errors):
+            return self.invalid(errors, {index for index, id in enumerate(ids) if id in forbidden})
+        try:
+            with transaction.atomic():
+                self.bulk_update([objects[id] for id in ids], validated)
+                self.written(ids)
+        except IntegrityError as e:
+            return Response({'message': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': [
+            {'index': index, 'status': 'updated', 'id': id} for index, id in enumerate(ids)
+        ]})
+
+    def delete(self, request):
+        serializer = BatchDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = serializer.validated_data['ids']
+        error = self.check_batch(ids)
+        if error:
+            return error
+        with transaction.atomic():
+            queryset = self.get_queryset().filter(id__in=ids)
+            existing = set(queryset.values_list('id', flat=True))
+            deleted = set(self.writable(queryset).values_list('id', flat=True))
+            self.get_queryset().filter(id__in=deleted).delete()
+            self.written(list(deleted))
+        return Response({'results': [
+            {'index': index, 'id': id,
+             'status': 'deleted' if id in deleted else 'forbidden' if id in existing else 'not_found'}
+            for index, id in enumerate(ids)
+        ]})
+
+
+class MovieBatchAPIView(BatchAPIView):
+    queryset = Movie.objects.all()
+    serializer_class = BatchMovieSerializer
+    version_models = (Movie, )
+
+    def writable(self, queryset):
+        # like IsOwner on the single movie endpoints
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(author=self.request.user)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # counted parents of the written movies, bulk writes send no signals
+        self.director_ids = set()
+        self.genre_ids = set()
+
+    def check_references(self, validated):
+        director_ids = {data['director_id'] for data in validated if 'director_id' in data}
+        genre_ids = {id for data in validated for id in data.get('genres', ())}
+        director_ids -= set(Director.objects.filter(id__in=director_ids).values_list('id', flat=True))
+        genre_ids -= set(Genre.objects.filter(id__in=genre_ids).values_list('id', flat=True))
+        if not director_ids and not genre_ids:
+            return None
+        errors = []
+        for data in validated:
+            item_errors = {}
+            if data.get('director_id') in director_ids:
+                item_errors['director'] = [f'Invalid pk "{data["director_id"]}" - object does not exist.']
+            missing = [id for id in data.get('genres', ()) if id in genre_ids]
+            if missing:
+                item_errors['genres'] = [f'Invalid pk "{id}" - object does not exist.' for id in missing]
+            errors.append(item_errors or None)
+        return errors
+
+    def bulk_create(self, validated):
+        Through = Movie.genres.through
+        genres = [data.pop('genres') for data in validated]
+        movies = Movie.objects.bulk_create([Movie(**data) for data in validated])
+        poster_storage.retain(*(data[field] for data in validated for field in POSTER_FIELDS if field in data))
+        self.director_ids.update(movie.director_id for movie in movies)
+        self.genre_ids.update(id for genre_ids in genres for id in genre_ids)
+        Through.objects.bulk_create([
+            Through(movie_id=movie.id, genre_id=genre_id)
+            for movie, genre_ids in zip(movies, genres)
+            for genre_id in dict.fromkeys(genre_ids)
+        ])
+        return movies
+
+    def bulk_update(self, objects, items):
+        Through = Movie.genres.through
+        genres = {obj.id: data.pop('genres') for obj, data in zip(objects, items) if 'genres' in data}
+        now = timezone.now()
+        for data in items:
+            data['updated_at'] = now
+        self.director_ids.update(obj.director_id for obj, data in zip(objects, items) if 'director_id' in data)
+        self.director_ids.update(data['director_id'] for data in items if 'director_id' in data)
+        replaced = [(getattr(obj, field).name, data[field]) for obj, data in zip(objects, items)
+                    for field in POSTER_FIELDS if field in data and data[field] != getattr(obj, field).name]
+        super().bulk_update(objects, items)
+        poster_storage.retain(*(new for _, new in replaced))
+        for old, _ in replaced:
+            # like django_cleanup, once the rows no longer point at it
+            transaction.on_commit(partial(poster_storage.delete, old))
+        if genres:
+            old = Through.objects.filter(movie_id__in=genres)
+            self.genre_ids.update(old.values_list('genre_id', flat=True))
+            self.genre_ids.update(id for genre_ids in genres.values() for id in genre_ids)
+            old.delete()
+            Through.objects.bulk_create([
+                Through(movie_id=movie_id, genre_id=genre_id)
+                for movie_id, genre_ids in genres.items()
+                for genre_id in dict.fromkeys(genre_ids)
+            ])
+
+    def written(self, ids):
+        super().written(ids)
+        search.index_movies(ids)
+        counts.recount(Director, 'movie_count', self.director_ids)
+        counts.recount(Genre, 'movie_count', self.genre_ids)
+
+
+class TimestampedBatchAPIView(BatchAPIView):
+
+    def bulk_update(self, objects, items):
+        now = timezone.now()
+        for data in items:
+            data['updated_at'] = now
+        super().bulk_update(objects, items)
+
+
+class GenreBatchAPIView(TimestampedBatchAPIView):
+    queryset = Genre.objects.all()
+    serializer_class = GenreSerializer
+    version_models = (Genre, )
+
+    def written(self, ids):
+        super().written(ids)
+        search.index_movies(Movie.objects.filter(genres__in=ids).values_list('id', flat=True).distinct())
+
+
+class DirectorBatchAPIView(TimestampedBatchAPIView):
+    queryset = Director.objects.all()
+    serializer_class = DirectorSerializer
+    version_models = (Director, )
+
+    def written(self, ids):
+        super().written(ids)
+        search.index_movies(Movie.objects.filter(director_id__in=ids).values_list('id', flat=True))
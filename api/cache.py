@@ -0,0 +1,112 @@
+"""
+Response cache for the read API.
+
+Keys are built from the scheme, host, path and query string of the request
+(cached payloads hold absolute URLs) plus the versions (``apps.versions``) of
+every model the endpoint reads, so a write to any of them makes the old
+entries unreachable. A miss builds the response
+from the primary database (``apps.routers.primary``), since the versions are
+bumped as soon as the write commits while a replica may still lag behind.
+``cache_response`` also wraps async views, through the async cache API.
+"""
+import hashlib
+import threading
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.metrics import registry
+from apps.routers import primary
+from apps.versions import aget_versions, get_versions
+
+
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+lookups = registry.counter('api_cache_lookups_total', 'API response cache lookups by result', labels=('result',))
+
+
+def get_config():
+    return {'ALIAS': 'default', 'TIMEOUT': 300, **getattr(settings, 'API_CACHE', {})}
+
+
+def _count(name):
+    with _lock:
+        stats[name] += 1
+    lookups.inc(result={'hits': 'hit', 'misses': 'miss'}[name])
+
+
+def get_stats():
+    with _lock:
+        return dict(stats)
+
+
+def _key(request, versions):
+    query = sorted(request.GET.lists())
+    raw = f'{request.scheme}://{request.get_host()}|{request.path}|{query}'
+    return f'api_cache:{hashlib.md5(raw.encode()).hexdigest()}:{".".join(map(str, versions))}'
+
+
+def response_key(request, models):
+    return _key(request, get_versions(*models))
+
+
+async def aresponse_key(request, models):
+    return _key(request, await aget_versions(*models))
+
+
+def _cached(cached):
+    _count('hits')
+    response = Response(cached)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cache_response(*models):
+    """
+    Cache successful ``GET`` responses of a view (function or method) that
+    reads ``models``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = args[1] if isinstance(args[0], APIView) else args[0]
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            config = get_config()
+            cache = caches[config['ALIAS']]
+            key = response_key(request, models)
+            cached = cache.get(key)
+            if cached is not None:
+                return _cached(cached)
+            _count('misses')
+            with primary():
+                response = view(*args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, config['TIMEOUT'])
+            response['X-Cache'] = 'MISS'
+            return response
+
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            request = args[1] if isinstance(args[0], APIView) else args[0]
+            if request.method != 'GET':
+                return await view(*args, **kwargs)
+            config = get_config()
+            cache = caches[config['ALIAS']]
+            key = await aresponse_key(request, models)
+            cached = await cache.aget(key)
+            if cached is not None:
+                return _cached(cached)
+            _count('misses')
+            with primary():
+                response = await view(*args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, response.data, config['TIMEOUT'])
+            response['X-Cache'] = 'MISS'
+            return response
+        return async_wrapper if iscoroutinefunction(view) else wrapper
+    return decorator
@@ -0,0 +1,107 @@
+"""
+Conditional GET (``ETag`` / ``Last-Modified``) for the read API.
+
+The validators are computed from ``updated_at`` columns with a single
+aggregate per model, before the view runs, so a ``304 Not Modified`` never
+touches the serializer. State functions carry an ``astate`` twin that runs the
+same aggregates through the async ORM, used when the decorated view is async.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.views import APIView
+
+
+def detail_state(model, *related):
+    """State of one object and the relations its serializer nests."""
+    names = ('updated_at', *related)
+
+    def aggregates():
+        aggregates = {'updated_at': Max('updated_at')}
+        for name in related:
+            aggregates[name] = Max(f'{name}__updated_at')
+        return aggregates
+
+    def result(values):
+        if values['updated_at'] is None:
+            return None
+        return [values[name] for name in names]
+
+    def state(request, kwargs):
+        return result(model.objects.filter(id=kwargs['id']).aggregate(**aggregates()))
+
+    async def astate(request, kwargs):
+        return result(await model.objects.filter(id=kwargs['id']).aaggregate(**aggregates()))
+    state.astate = astate
+    return state
+
+
+def list_state(*models):
+    """State of whole tables: newest ``updated_at`` and row count of each."""
+    def state(request, kwargs):
+        values = []
+        for model in models:
+            aggregate = model.objects.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+            values += [aggregate['updated_at'], aggregate['count']]
+        return values
+
+    async def astate(request, kwargs):
+        values = []
+        for model in models:
+            aggregate = await model.objects.aaggregate(updated_at=Max('updated_at'), count=Count('id'))
+            values += [aggregate['updated_at'], aggregate['count']]
+        return values
+    state.astate = astate
+    return state
+
+
+def validators(request, state):
+    raw = f'{request.get_full_path()}|{"|".join(map(str, state))}'
+    etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+    dates = [value for value in state if hasattr(value, 'timestamp')]
+    return etag, int(max(dates).timestamp()) if dates else None
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def conditional(state_func):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = args[1] if isinstance(args[0], APIView) else args[0]
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            state = state_func(request, kwargs)
+            if state is None:
+                return view(*args, **kwargs)
+            etag, last_modified = validators(request, state)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(*args, **kwargs)
+            return add_validators(response, etag, last_modified)
+
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            request = args[1] if isinstance(args[0], APIView) else args[0]
+            if request.method not in ('GET', 'HEAD'):
+                return await view(*args, **kwargs)
+            state = await state_func.astate(request, kwargs)
+            if state is None:
+                return await view(*args, **kwargs)
+            etag, last_modified = validators(request, state)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(*args, **kwargs)
+            return add_validators(response, etag, last_modified)
+        return async_wrapper if iscoroutinefunction(view) else wrapper
+    return decorator
@@ -1,8 +1,110 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from apps.paginations import KeysetPaginator, InvalidCursor, page_size
 
 
 class SimpleResultPagination(PageNumberPagination):
     page_size = 12
     page_query_param = 'page'
     page_size_query_paramv = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` with the count and the page read through the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+        return list(self.page)
+
+
+class KeysetResultPagination(BasePagination):
+    """
+    Cursor pagination over ``view.keyset_orderings`` (``?sort=``), defaults
+    to newest first.
+    """
+    page_size = 12
+    cursor_query_param = 'cursor'
+    sort_query_param = 'sort'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    orderings = {'new': ('-id',)}
+
+    def get_page_size(self, request):
+        return page_size(request.query_params.get(self.page_size_query_param), self.page_size, self.max_page_size)
+
+    def get_paginator(self, queryset, request, view):
+        self.request = request
+        orderings = getattr(view, 'keyset_orderings', self.orderings)
+        sort = request.query_params.get(self.sort_query_param, 'new')
+        if sort not in orderings:
+            raise NotFound('Invalid sort')
+        return KeysetPaginator(queryset, self.get_page_size(request), orderings[sort], name=sort)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise ValidationError({self.cursor_query_param: ['Invalid cursor']})
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = await paginator.apage(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise ValidationError({self.cursor_query_param: ['Invalid cursor']})
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class SimpleOrKeysetPagination(BasePagination):
+    """Page numbers by default, keyset pagination once the client sends ``cursor``."""
+
+    def get_delegate(self, request):
+        if KeysetResultPagination.cursor_query_param in request.query_params:
+            return KeysetResultPagination()
+        return SimpleResultPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.get_delegate(request)
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.get_delegate(request)
+        return await self.delegate.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
@@ -0,0 +1,90 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from api.serializers import sparse_options
+
+
+def related_paths(serializer, prefix=''):
+    """
+    Collect the relations a serializer walks through, as ``select_related``
+    and ``prefetch_related`` lookups.
+    """
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        path = prefix + field.source.replace('.', '__')
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.append(path)
+            nested_select, nested_prefetch = related_paths(field.child, path + '__')
+            prefetch += nested_select + nested_prefetch
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.append(path)
+        elif isinstance(field, serializers.BaseSerializer):
+            select.append(path)
+            nested_select, nested_prefetch = related_paths(field, path + '__')
+            select += nested_select
+            prefetch += nested_prefetch
+    return select, prefetch
+
+
+def loaded_fields(serializer, model, prefix=''):
+    """
+    Columns a serializer reads, as ``only()`` lookups. ``None`` when a field
+    is backed by something other than a model field, which may read anything.
+    """
+    names = [prefix + model._meta.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+        try:
+            model_field = model._meta.get_field(field.source.split('.')[0])
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            continue
+        names.append(prefix + model_field.name)
+        if model_field.is_relation and isinstance(field, serializers.BaseSerializer):
+            nested = loaded_fields(field, model_field.related_model, prefix + model_field.name + '__')
+            if nested is None:
+                return None
+            names += nested
+    return names
+
+
+def eager_load(queryset, serializer, keep=()):
+    """
+    Load what ``serializer`` (a class or an instance configured with
+    ``fields``/``expand``) renders: its relations eagerly and only the columns
+    it reads, plus the ``keep`` ones (e.g. ordering keys).
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    select, prefetch = related_paths(serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    only = loaded_fields(serializer, queryset.model)
+    if only is not None:
+        queryset = queryset.only(*only, *keep)
+    return queryset
+
+
+def ordering_fields(orderings):
+    """Fields of ``{name: ('-field', ...)}`` orderings, to keep loaded for cursors."""
+    return {field.lstrip('-') for ordering in orderings.values() for field in ordering}
+
+
+class EagerLoadingMixin:
+    """Eager-load whatever the view's serializer renders for this request."""
+
+    def get_serializer_kwargs(self):
+        return sparse_options(self.request) if self.request is not None else {}
+
+    def get_queryset(self):
+        serializer = self.get_serializer_class()(**self.get_serializer_kwargs())
+        keep = ordering_fields(getattr(self, 'keyset_orderings', {}))
+        return eager_load(super().get_queryset(), serializer, keep)
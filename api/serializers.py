@@ -1,16 +1,62 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 
+from apps import thumbnails
+from apps.storage import poster_storage
 from apps.models import Genre, Movie, Director
 
 
+class PosterSrcsetField(serializers.ReadOnlyField):
+    """``{format: srcset}`` of the resized derivatives recorded in a ``*_derivatives`` field."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        result = {}
+        for fmt in thumbnails.get_config()['FORMATS']:
+            result[fmt] = ', '.join(
+                f'{request.build_absolute_uri(url) if request else url} {width}w'
+                for url, width in thumbnails.variants(value, fmt)
+            )
+        return result
+
+
+def sparse_options(request):
+    """Serializer ``fields`` and ``expand`` options from ``?fields=a,b&expand=c``."""
+    params = getattr(request, 'query_params', request.GET)
+    return {
+        option: [name for name in params[option].split(',') if name]
+        for option in ('fields', 'expand') if params.get(option)
+    }
+
+
+class SparseFieldsMixin:
+    """
+    ``fields`` limits the output to the listed fields, ``expand`` nests the
+    relations of ``expandable_fields`` that otherwise render as ids.
+    """
+    # name: (serializer class, kwargs)
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            if name in self.expandable_fields:
+                serializer_class, options = self.expandable_fields[name]
+                self.fields[name] = serializer_class(read_only=True, **options)
+        if fields is not None:
+            keep = set(fields) | set(expand)
+            for name in list(self.fields):
+                if name not in keep and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = '__all__'
 
     def create(self, validated_data):
-        return super().create(**validated_data)
+        return super().create(validated_data)
     
     def update(self, instance, validated_data):
         return super().update(instance, validated_data)
@@ -28,15 +74,22 @@ class UserSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class MovieSerializer(serializers.ModelSerializer):
-    director = DirectorSerializer(many=False)
-    genres = GenreSerializer(many=True)
+class MovieSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    director = serializers.PrimaryKeyRelatedField(read_only=True)
+    genres = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    image_srcset = PosterSrcsetField(source='image_derivatives')
+    inner_image_srcset = PosterSrcsetField(source='inner_image_derivatives')
     # user_id = serializers.IntegerField(source='author.id')
 
+    expandable_fields = {
+        'director': (DirectorSerializer, {}),
+        'genres': (GenreSerializer, {'many': True}),
+    }
+
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = ('image_derivatives', 'inner_image_derivatives')
 
 
 class AddUpdateMovieSerializer(serializers.ModelSerializer):
@@ -45,11 +98,35 @@ class AddUpdateMovieSerializer(serializers.ModelSerializer):
  
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = ('image_derivatives', 'inner_image_derivatives')
 
     def create(self, validated_data):
-        return super().create(**validated_data)
+        return super().create(validated_data)
     
     def update(self, instance, validated_data):
         return super().update(instance, validated_data)
 
+
+
+class BatchDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class BatchMovieSerializer(AddUpdateMovieSerializer):
+    """
+    Movie item of a batch write. Posters are names of files already in storage
+    since a JSON batch cannot carry uploads, and related objects are plain ids
+    checked in one query per batch by the view.
+    """
+    image = serializers.CharField(max_length=100)
+    inner_image = serializers.CharField(max_length=100)
+    director = serializers.IntegerField(source='director_id')
+    genres = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    author = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+    def validate_image(self, value):
+        if not poster_storage.exists(value):
+            raise serializers.ValidationError('No such file in storage')
+        return value
+
+    validate_inner_image = validate_image
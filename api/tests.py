@@ -0,0 +1,385 @@
+import json
+from base64 import b64encode
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import async_views, authentication, batch, views
+from api.cache import cache_response
+from api.querysets import eager_load
+from api.serializers import MovieSerializer
+from api.values import ValuesSerializer
+from apps.models import Director, Genre, Movie
+from apps.routers import ReplicaMiddleware
+from apps.tests import create_catalog
+from apps.versions import get_version
+
+
+class MovieQueryBudgetTests(TestCase):
+    """
+    Query counts must not grow with the number of movies on a page. Lists
+    spend one ETag aggregate per model (movie, director, genre), details one
+    for the movie and its relations.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog()
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def test_movies_generic_list(self):
+        with self.assertNumQueries(3 + 3):
+            response = self.client.get('/api/movies/')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_movies_generic_detail(self):
+        with self.assertNumQueries(1 + 2):
+            response = self.client.get(f'/api/movies/{self.movie.id}/')
+        self.assertEqual(len(response.json()['genres']), 3)
+
+    def test_list_movies(self):
+        request = self.factory.get('/', {'limit': 5})
+        with self.assertNumQueries(3 + 3):
+            response = views.list_movies(request)
+        self.assertEqual(len(response.data['data']), 5)
+
+    def test_detail_movies(self):
+        request = self.factory.get('/', {'expand': 'director,genres'})
+        with self.assertNumQueries(1 + 2):
+            response = views.detail_movies(request, id=self.movie.id)
+        self.assertEqual(response.data['director']['full_name'], 'Director')
+        self.assertEqual(len(response.data['genres']), 3)
+
+    def test_sparse_fieldset(self):
+        request = self.factory.get('/', {'limit': 5, 'fields': 'id,name,director'})
+        with self.assertNumQueries(3 + 2) as queries:
+            response = views.list_movies(request)
+        self.assertEqual(set(response.data['data'][0]), {'id', 'name', 'director'})
+        self.assertIsInstance(response.data['data'][0]['director'], int)
+        # the page query skips overview, and genres are not prefetched
+        self.assertNotIn('overview', queries.captured_queries[-1]['sql'])
+
+
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCache(self, url, expected, **extra):
+        self.assertEqual(self.client.get(url, **extra)['X-Cache'], expected)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.testserver'])
+    def test_hit_after_miss(self):
+        self.assertCache('/api/movies/', 'MISS')
+        self.assertCache('/api/movies/', 'HIT')
+        # the query string, the host and the scheme are part of the key
+        self.assertCache('/api/movies/?limit=1', 'MISS')
+        self.assertCache('/api/movies/?limit=1', 'HIT')
+        self.assertCache('/api/movies/', 'MISS', HTTP_HOST='other.testserver')
+        self.assertCache('/api/movies/', 'MISS', secure=True)
+        self.assertCache('/api/movies/', 'HIT', secure=True)
+
+    def test_writes_invalidate(self):
+        director = Director.objects.get()
+        genre = Genre.objects.first()
+        writes = [
+            lambda: self.movie.save(),
+            lambda: genre.save(),
+            lambda: director.save(),
+            lambda: self.movie.genres.remove(genre),
+        ]
+        for write in writes:
+            self.assertCache('/api/movies/', 'MISS')
+            self.assertCache('/api/movies/', 'HIT')
+            write()
+        self.assertCache('/api/movies/', 'MISS')
+
+    @override_settings(DATABASE_ROUTING={'REPLICAS': ['replica']})
+    def test_cache_misses_read_the_primary(self):
+        routes = []
+
+        @cache_response(Movie)
+        def view(request):
+            routes.append(router.db_for_read(Movie))
+            return Response({'movies': []})
+
+        def read(request):
+            view(request)
+            routes.append(router.db_for_read(Movie))
+            return HttpResponse()
+
+        for _ in range(2):
+            ReplicaMiddleware(read)(RequestFactory().get('/api/movies/'))
+        # the second response comes from the cache, reads outside the view still use the replica
+        self.assertEqual(routes, ['default', 'replica', 'replica'])
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_not_modified(self):
+        url = f'/api/movies/{self.movie.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.movie.genres.remove(Genre.objects.first())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_not_modified(self):
+        etag = self.client.get('/api/genres/')['ETag']
+        self.assertEqual(self.client.get('/api/genres/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Genre.objects.create(name='New')
+        self.assertEqual(self.client.get('/api/genres/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BatchWriteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=3)
+        cls.user = User.objects.create_user('editor')
+        Movie.objects.update(author=cls.user)
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method, data):
+        request = getattr(self.factory, method)('/', data, format='json')
+        force_authenticate(request, self.user)
+        return view.as_view()(request)
+
+    def test_create_reports_each_item(self):
+        response = self.call(batch.GenreBatchAPIView, 'post', [{'name': 'Drama'}, {'name': 'Comedy'}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['status'] for item in response.data['results']], ['created', 'created'])
+        self.assertTrue(Genre.objects.filter(id=response.data['results'][1]['id'], name='Comedy').exists())
+
+    def test_invalid_item_rolls_back_batch(self):
+        response = self.call(batch.MovieBatchAPIView, 'patch', [
+            {'id': self.movie.id, 'name': 'Renamed'},
+            {'id': self.movie.id + 1, 'genres': [0]},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['status'] for item in response.data['results']], ['valid', 'invalid'])
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.name, 'Movie 0')
+
+    def test_update_and_delete(self):
+        genre = Genre.objects.first()
+        ids = list(Movie.objects.values_list('id', flat=True))
+        movie_version, genre_version = get_version(Movie), get_version(Genre)
+        response = self.call(batch.MovieBatchAPIView, 'patch', [{'id': id, 'genres': [genre.id]} for id in ids])
+        self.assertEqual(response.status_code, 200)
+        # genre responses hold no movies, only the counts which stay out of the versions
+        self.assertNotEqual(get_version(Movie), movie_version)
+        self.assertEqual(get_version(Genre), genre_version)
+        self.assertEqual(list(genre.movies.order_by('id').values_list('id', flat=True)), ids)
+        self.assertEqual(list(Genre.objects.order_by('id').values_list('movie_count', flat=True)), [len(ids), 0, 0])
+
+        response = self.call(batch.MovieBatchAPIView, 'delete', {'ids': [ids[0], 0]})
+        self.assertEqual([item['status'] for item in response.data['results']], ['deleted', 'not_found'])
+        self.assertFalse(Movie.objects.filter(id=ids[0]).exists())
+        self.assertEqual(Genre.objects.get(id=genre.id).movie_count, len(ids) - 1)
+
+    def test_only_owners_write(self):
+        self.user = User.objects.create_user('other')
+        response = self.call(batch.MovieBatchAPIView, 'delete', {'ids': [self.movie.id]})
+        self.assertEqual([item['status'] for item in response.data['results']], ['forbidden'])
+        self.assertTrue(Movie.objects.filter(id=self.movie.id).exists())
+
+        response = self.call(batch.MovieBatchAPIView, 'patch', [{'id': self.movie.id, 'name': 'Renamed'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['status'], 'forbidden')
+
+    def test_delete_validates_ids(self):
+        response = self.call(batch.MovieBatchAPIView, 'delete', {'ids': ['x']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.data)
+
+    @override_settings(API_BATCH_MAX_SIZE=2)
+    def test_batch_size_cap(self):
+        response = self.call(batch.DirectorBatchAPIView, 'post', [{'full_name': str(i)} for i in range(3)])
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Director.objects.count(), 1)
+
+
+class ValuesSerializerTests(TestCase):
+    """The .values() list path must render exactly what MovieSerializer does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(movies=4)
+        director = Director.objects.create(full_name='Other')
+        Movie.objects.filter(id=Movie.objects.first().id).update(director=director, views=3)
+        Movie.objects.last().genres.clear()
+
+    def test_same_json_as_serializer(self):
+        request = Request(APIRequestFactory().get('/'))
+        for options in ({}, {'expand': ['director', 'genres']}, {'fields': ['name', 'genres'], 'expand': ['genres']},
+                        {'fields': ['id', 'director', 'image_srcset']}):
+            with self.subTest(**options):
+                serializer = MovieSerializer(context={'request': request}, **options)
+                movies = eager_load(Movie.objects.order_by('id'), serializer)
+                expected = MovieSerializer(movies, many=True, context={'request': request}, **options).data
+                values = ValuesSerializer(serializer)
+                data = values.render(values.values(Movie.objects.order_by('id')))
+                self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+
+class AsyncReadTests(TestCase):
+    """The async read views must answer like the sync ones, with the same queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=4)
+        cls.genre = Genre.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    def test_same_json_as_generic_views(self):
+        cases = [
+            (async_views.movies, '/api/movies/', {}),
+            (async_views.movies, '/api/movies/', {'cursor': '', 'sort': 'rating', 'fields': 'id,name,genres'}),
+            (async_views.movie, f'/api/movies/{self.movie.id}/', {'expand': 'director,genres'}),
+            (async_views.movie, '/api/movies/0/', {}),
+            (async_views.genres, '/api/genres/', {}),
+            (async_views.genre, f'/api/genres/{self.genre.id}/', {}),
+            (async_views.directors, '/api/directors/', {'page': 2}),
+            (async_views.director, f'/api/directors/{self.movie.director_id}/', {}),
+        ]
+        for view, path, params in cases:
+            with self.subTest(path=path, **params):
+                cache.clear()
+                with CaptureQueriesContext(connection) as expected_queries:
+                    expected = self.client.get(path, params)
+                cache.clear()
+                kwargs = {'id': int(path.split('/')[3])} if path.count('/') > 3 else {}
+                with CaptureQueriesContext(connection) as queries:
+                    response = async_to_sync(view)(self.factory.get(path, params), **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), expected.json())
+                self.assertEqual(len(queries), len(expected_queries))
+
+    async def test_function_views(self):
+        for name, params in (('list_movies', {'limit': 3, 'offset': 2}), ('list_movies', {'cursor': ''}),
+                             ('list_genres', {}), ('list_directors', {'cursor': '', 'limit': 1})):
+            with self.subTest(name=name, **params):
+                await cache.aclear()
+                expected = await sync_to_async(getattr(views, name))(APIRequestFactory().get('/', params))
+                await cache.aclear()
+                response = await getattr(async_views, name)(self.factory.get('/', params))
+                self.assertEqual(json.loads(response.content), json.loads(expected.render().content))
+
+    async def test_not_modified(self):
+        path = f'/api/movies/{self.movie.id}/'
+        response = await async_views.movie(self.factory.get(path), id=self.movie.id)
+        response = await async_views.movie(self.factory.get(path, headers={'If-None-Match': response['ETag']}),
+                                           id=self.movie.id)
+        self.assertEqual(response.status_code, 304)
+
+    def test_checks_credentials(self):
+        User.objects.create_user('reader', password='secret')
+        for password, status in (('wrong', 401), ('secret', 200)):
+            with self.subTest(password=password):
+                headers = {'Authorization': 'Basic ' + b64encode(f'reader:{password}'.encode()).decode()}
+                response = async_to_sync(async_views.genres)(self.factory.get('/api/genres/', headers=headers))
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(self.client.get('/api/genres/', headers=headers).status_code, status)
+        self.assertEqual(response.status_code, 200)
+        response = async_to_sync(async_views.genres)(self.factory.get('/', headers={'Authorization': 'Basic bad'}))
+        self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+    def test_write_goes_to_sync_view(self):
+        view = async_views.read_or_write(async_views.genre, views.DetailGenreGenericAPIView.as_view())
+        request = APIRequestFactory().put('/', {'name': 'Renamed'}, format='json')
+        response = async_to_sync(view)(request, id=self.genre.id)
+        self.assertEqual(response.data['name'], 'Renamed')
+        self.assertEqual(response['Allow'], 'GET, PUT, DELETE, HEAD, OPTIONS')
+
+    async def test_middleware_under_asgi(self):
+        response = await self.async_client.get('/api/movies/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('"6 queries"', response['Server-Timing'])
+        self.assertIn('view;dur=', response['Server-Timing'])
+
+
+class CachedAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication.tokens.clear()
+        self.user = User.objects.create_user('reader', password='secret-1')
+
+    def basic(self, password):
+        credentials = b64encode(f'reader:{password}'.encode()).decode()
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Basic {credentials}'))
+        return authentication.CachedBasicAuthentication().authenticate(request)[0]
+
+    def token(self, key):
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key}'))
+        return authentication.CachedTokenAuthentication().authenticate(request)[0]
+
+    def test_basic_checks_password_once(self):
+        with mock.patch.object(User, 'check_password', autospec=True, side_effect=User.check_password) as check:
+            self.assertEqual(self.basic('secret-1'), self.user)
+            self.assertEqual(self.basic('secret-1'), self.user)
+            self.assertEqual(check.call_count, 1)
+
+            user_logged_out.send(sender=User, request=None, user=self.user)
+            self.basic('secret-1')
+            self.assertEqual(check.call_count, 2)
+
+        self.user.set_password('secret-2')
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.basic('secret-1')
+        self.assertEqual(self.basic('secret-2'), self.user)
+
+    def test_token_skips_database_until_rotated(self):
+        key = Token.objects.create(user=self.user).key
+        self.assertEqual(self.token(key), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.token(key), self.user)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.token(key)
+        self.user.is_active = True
+        self.user.save()
+
+        response = self.client.post('/api/auth/token/rotate/', HTTP_AUTHORIZATION=f'Token {key}')
+        with self.assertRaises(AuthenticationFailed):
+            self.token(key)
+        self.assertEqual(self.token(response.json()['token']), self.user)
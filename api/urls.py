@@ -1,19 +1,30 @@
+from django.conf import settings
 from django.urls import path, include
 
 import api.views
-from . import views
+from . import async_views, batch, views
+
+
+def reads(view, async_read):
+    """``view``, with its reads served by the async ``async_read`` when ``API_ASYNC_READS`` is on."""
+    if settings.API_ASYNC_READS:
+        return async_views.read_or_write(async_read, view)
+    return view
 
 
 urlpatterns = [
     path('users/', views.list_users),
-    path('genres/', views.GenresGenericAPILIST.as_view()),
-    path('genres/<int:id>/', views.DetailGenreGenericAPIView.as_view()),
+    path('genres/', reads(views.GenresGenericAPILIST.as_view(), async_views.genres)),
+    path('genres/<int:id>/', reads(views.DetailGenreGenericAPIView.as_view(), async_views.genre)),
     path('genres/fetch/', views.fetch_list_genres),
-    path('directors/', views.DirectorsGenericAPIView.as_view()),
-    path('directors/<int:id>/', views.DetailDirectorGenericAPIView.as_view()),
+    path('genres/batch/', batch.GenreBatchAPIView.as_view()),
+    path('directors/', reads(views.DirectorsGenericAPIView.as_view(), async_views.directors)),
+    path('directors/<int:id>/', reads(views.DetailDirectorGenericAPIView.as_view(), async_views.director)),
     path('directors/fetch/', views.fetch_list_directors),
-    path('movies/', api.views.MoviesGenericAPIView.as_view()),
-    path('movies/<int:id>/', api.views.DetailMovieGenericAPIView.as_view()),
+    path('directors/batch/', batch.DirectorBatchAPIView.as_view()),
+    path('movies/', reads(api.views.MoviesGenericAPIView.as_view(), async_views.movies)),
+    path('movies/<int:id>/', reads(api.views.DetailMovieGenericAPIView.as_view(), async_views.movie)),
     path('movies/fetch/', views.fetch_movies),
+    path('movies/batch/', batch.MovieBatchAPIView.as_view()),
     path('auth/', include('api.auth.urls'))
 ]
@@ -0,0 +1,151 @@
+"""
+Read-only rendering of ``.values()`` rows.
+
+``ValuesSerializer`` wraps a configured ``ModelSerializer`` (fields, expand,
+context) and renders plain rows into the same data, without instantiating
+models or walking ``get_attribute`` per field. Foreign keys and many-to-many
+relations are resolved with one lookup query per relation for the whole page.
+The ``a``-prefixed methods run those queries through the async ORM.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import FileField
+
+from apps.timing import timed
+
+
+class Unsupported(Exception):
+    """The serializer has a field that can't be rendered from a row."""
+
+
+VALUE, FILE, PK, NESTED, MANY_PK, MANY_NESTED = range(6)
+
+
+class ValuesSerializer:
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.columns = [self.pk]
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise Unsupported(name)
+            try:
+                model_field = self.model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+
+            if model_field.many_to_many:
+                if isinstance(field, serializers.ListSerializer):
+                    self.plan.append((name, MANY_NESTED, model_field, ValuesSerializer(field.child)))
+                elif isinstance(field, serializers.ManyRelatedField):
+                    self.plan.append((name, MANY_PK, model_field, field))
+                else:
+                    raise Unsupported(name)
+                continue
+            if model_field.one_to_many or not model_field.concrete:
+                raise Unsupported(name)
+
+            column = model_field.attname
+            if column not in self.columns:
+                self.columns.append(column)
+            if model_field.is_relation:
+                if isinstance(field, serializers.BaseSerializer):
+                    self.plan.append((name, NESTED, model_field, ValuesSerializer(field)))
+                elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                    self.plan.append((name, PK, model_field, field))
+                else:
+                    raise Unsupported(name)
+            elif isinstance(field, FileField) or hasattr(model_field, 'attr_class'):
+                self.plan.append((name, FILE, model_field, field))
+            else:
+                self.plan.append((name, VALUE, model_field, field))
+
+    def values(self, queryset, keep=()):
+        """``queryset`` as rows with the columns this serializer needs plus ``keep``."""
+        return queryset.values(*self.columns, *[column for column in keep if column not in self.columns])
+
+    def _pairs(self, model_field, rows):
+        """``(id, related id)`` query of a many-to-many relation of ``rows``."""
+        through = model_field.remote_field.through
+        source = model_field.m2m_field_name()
+        target = model_field.m2m_reverse_field_name()
+        ids = [row[self.pk] for row in rows]
+        return through.objects.filter(**{f'{source}__in': ids}).order_by(target).values_list(source, target)
+
+    def lookups(self, rows):
+        lookups = {}
+        for name, kind, model_field, nested in self.plan:
+            if kind == NESTED:
+                related_ids = {row[model_field.attname] for row in rows} - {None}
+                lookups[name] = nested.by_pk(model_field.related_model, related_ids)
+            elif kind in (MANY_PK, MANY_NESTED):
+                related = {}
+                for id, related_id in self._pairs(model_field, rows):
+                    related.setdefault(id, []).append(related_id)
+                if kind == MANY_NESTED:
+                    related_ids = {related_id for values in related.values() for related_id in values}
+                    items = nested.by_pk(model_field.related_model, related_ids)
+                    related = {id: [items[related_id] for related_id in values] for id, values in related.items()}
+                lookups[name] = related
+        return lookups
+
+    async def alookups(self, rows):
+        lookups = {}
+        for name, kind, model_field, nested in self.plan:
+            if kind == NESTED:
+                related_ids = {row[model_field.attname] for row in rows} - {None}
+                lookups[name] = await nested.aby_pk(model_field.related_model, related_ids)
+            elif kind in (MANY_PK, MANY_NESTED):
+                related = {}
+                async for id, related_id in self._pairs(model_field, rows):
+                    related.setdefault(id, []).append(related_id)
+                if kind == MANY_NESTED:
+                    related_ids = {related_id for values in related.values() for related_id in values}
+                    items = await nested.aby_pk(model_field.related_model, related_ids)
+                    related = {id: [items[related_id] for related_id in values] for id, values in related.items()}
+                lookups[name] = related
+        return lookups
+
+    def by_pk(self, model, ids):
+        rows = list(self.values(model._default_manager.filter(pk__in=ids)))
+        return {row[self.pk]: item for row, item in zip(rows, self.render(rows))}
+
+    async def aby_pk(self, model, ids):
+        rows = [row async for row in self.values(model._default_manager.filter(pk__in=ids))]
+        return {row[self.pk]: item for row, item in zip(rows, await self.arender(rows))}
+
+    def render(self, rows):
+        """Serialized data of ``rows``, the same as ``serializer.data`` for the matching instances."""
+        with timed('serializer'):
+            rows = list(rows)
+            return self._render(rows, self.lookups(rows))
+
+    async def arender(self, rows):
+        with timed('serializer'):
+            rows = list(rows)
+            return self._render(rows, await self.alookups(rows))
+
+    def _render(self, rows, lookups):
+        data = []
+        for row in rows:
+            item = {}
+            for name, kind, model_field, field in self.plan:
+                if kind == VALUE:
+                    value = row[model_field.attname]
+                    item[name] = None if value is None else field.to_representation(value)
+                elif kind == FILE:
+                    value = model_field.attr_class(None, model_field, row[model_field.attname])
+                    item[name] = field.to_representation(value)
+                elif kind == PK:
+                    item[name] = row[model_field.attname]
+                elif kind == NESTED:
+                    value = row[model_field.attname]
+                    item[name] = None if value is None else lookups[name][value]
+                else:
+                    item[name] = lookups[name].get(row[self.pk], [])
+            data.append(item)
+        return data
@@ -11,10 +11,43 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser, I
 from rest_framework.decorators import permission_classes
 from rest_framework import status
 
+from api.cache import cache_response
+from api.conditional import conditional, detail_state, list_state
 from api.permissions import IsOwner, IsSuperAdmin, IsSuperAdminOrReadOnly
-from api.paginations import SimpleResultPagination
-from api.serializers import GenreSerializer, DirectorSerializer, MovieSerializer, AddUpdateMovieSerializer, UserSerializer
+from api.paginations import KeysetResultPagination, SimpleOrKeysetPagination
+from api.querysets import EagerLoadingMixin, eager_load, ordering_fields
+from api.serializers import GenreSerializer, DirectorSerializer, MovieSerializer, AddUpdateMovieSerializer, UserSerializer, sparse_options
+from api.values import ValuesSerializer
 from apps.models import Genre, Director, Movie
+from apps.paginations import MOVIE_ORDERINGS, page_size
+
+
+# models whose writes invalidate the cached responses of each resource
+GENRE_MODELS = (Genre,)
+DIRECTOR_MODELS = (Director,)
+MOVIE_MODELS = (Movie, Director, Genre)
+
+
+def keyset_response(request, queryset, serializer_class, orderings=None, context=None):
+    """
+    Response of the ``list_*`` views in cursor mode (``?cursor=``).
+    ``serializer_class`` may also be a ``ValuesSerializer`` for a ``.values()`` queryset.
+    """
+    pagination = KeysetResultPagination()
+    pagination.page_size_query_param = 'limit'
+    if orderings is not None:
+        pagination.orderings = orderings
+    items = pagination.paginate_queryset(queryset, request)
+    if isinstance(serializer_class, ValuesSerializer):
+        data = serializer_class.render(items)
+    else:
+        data = serializer_class(instance=items, many=True, context=context or {}).data
+    return Response({
+        'limit': pagination.get_page_size(request),
+        'next': pagination.get_next_link(),
+        'previous': pagination.get_previous_link(),
+        'data': data,
+    })
 
 
 class GenresGenericAPILIST(ListCreateAPIView):
@@ -22,6 +55,11 @@ class GenresGenericAPILIST(ListCreateAPIView):
     serializer_class = GenreSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
+    @conditional(list_state(*GENRE_MODELS))
+    @cache_response(*GENRE_MODELS)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 # class GenresGenericAPIView(GenericAPIView):
 #     queryset = Genre.objects.all()
@@ -54,6 +92,8 @@ class DetailGenreGenericAPIView(GenericAPIView):
         except Genre.DoesNotExist as e:
             raise Http404
 
+    @conditional(detail_state(Genre))
+    @cache_response(*GENRE_MODELS)
     def get(self, request, id):
         genre = self.get_item(id)
         serializer = self.serializer_class(instance=genre, many=False)
@@ -79,8 +119,10 @@ def fetch_list_genres(request):
 class DirectorsGenericAPIView(GenericAPIView):
     queryset = Director.objects.all()
     serializer_class = DirectorSerializer
-    pagination_class = SimpleResultPagination
+    pagination_class = SimpleOrKeysetPagination
 
+    @conditional(list_state(*DIRECTOR_MODELS))
+    @cache_response(*DIRECTOR_MODELS)
     def get(self, request):
         directors = self.queryset
         queryset = self.paginate_queryset(directors)
@@ -106,6 +148,8 @@ class DetailDirectorGenericAPIView(GenericAPIView):
         except Director.DoesNotExist as e:
             raise Http404
         
+    @conditional(detail_state(Director))
+    @cache_response(*DIRECTOR_MODELS)
     def get(self, request, id):
         director = self.get_item(id)
         serializer = self.serializer_class(instance=director, many=False)
@@ -128,16 +172,20 @@ def fetch_list_directors(request):
     return render(request, 'api/directors.html')
     
 
-class MoviesGenericAPIView(GenericAPIView):
+class MoviesGenericAPIView(EagerLoadingMixin, GenericAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
-    pagination_class = SimpleResultPagination
+    pagination_class = SimpleOrKeysetPagination
+    keyset_orderings = MOVIE_ORDERINGS
 
+    @conditional(list_state(*MOVIE_MODELS))
+    @cache_response(*MOVIE_MODELS)
     def get(self, request):
-        movies = self.queryset
-        queryset = self.paginate_queryset(movies)
-        serializer =  self.serializer_class(queryset, many=True)
-        return self.get_paginated_response(serializer.data)
+        # read-only list: render .values() rows, same output as the serializer
+        serializer = ValuesSerializer(self.serializer_class(**self.get_serializer_kwargs()))
+        movies = serializer.values(self.queryset.all(), ordering_fields(self.keyset_orderings))
+        rows = self.paginate_queryset(movies)
+        return self.get_paginated_response(serializer.render(rows))
     
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -147,20 +195,22 @@ class MoviesGenericAPIView(GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class DetailMovieGenericAPIView(GenericAPIView):
+class DetailMovieGenericAPIView(EagerLoadingMixin, GenericAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     lookup_field = 'id'
 
     def get_item(self, id):
         try:
-            return self.queryset.get(id=id)
+            return self.get_queryset().get(id=id)
         except Movie.DoesNotExist as e:
             raise Http404
         
+    @conditional(detail_state(Movie, 'director', 'genres'))
+    @cache_response(*MOVIE_MODELS)
     def get(self, request, id):
         movie = self.get_item(id)
-        serializer = self.serializer_class(instance=movie, many=False)
+        serializer = self.serializer_class(instance=movie, many=False, **self.get_serializer_kwargs())
         return Response(serializer.data)
     
     def patch(self, request, id):
@@ -178,28 +228,34 @@ class DetailMovieGenericAPIView(GenericAPIView):
 
 @api_view()
 @permission_classes((AllowAny,))
+@conditional(list_state(*MOVIE_MODELS))
+@cache_response(*MOVIE_MODELS)
 def list_movies(request):
-    movies = Movie.objects.all()
-    count = movies.count()
-    limit = request.GET.get('limit', 2)
+    serializer = ValuesSerializer(MovieSerializer(context={'request': request}, **sparse_options(request)))
+    movies = serializer.values(Movie.objects.all(), ordering_fields(MOVIE_ORDERINGS))
+    if 'cursor' in request.GET:
+        return keyset_response(request, movies, serializer, MOVIE_ORDERINGS)
+    limit = page_size(request.GET.get('limit'), 2)
     offset = request.GET.get('offset', 1)
     paginator = Paginator(movies, limit)
     movies = paginator.get_page(offset)
-    serializer = MovieSerializer(instance=movies, many=True, context={'request': request})
     response = {
-        'count': count,
-        'limit': int(limit),
-        'offset': int(offset),
+        'count': paginator.count,
+        'limit': limit,
+        'offset': movies.number,
         'page_count': paginator.num_pages,
-        'data': serializer.data
+        'data': serializer.render(movies)
     }
     return Response(response)
 
 
 @api_view()
+@conditional(detail_state(Movie, 'director', 'genres'))
+@cache_response(*MOVIE_MODELS)
 def detail_movies(request, id):
-    movie = get_object_or_404(Movie, id=id)
-    serializer = MovieSerializer(instance=movie, many=False, context={'request': request})
+    options = sparse_options(request)
+    movie = get_object_or_404(eager_load(Movie.objects.all(), MovieSerializer(**options)), id=id)
+    serializer = MovieSerializer(instance=movie, many=False, context={'request': request}, **options)
     return Response(serializer.data)
 
 @api_view(['POST'])
@@ -237,16 +293,17 @@ def fetch_movies(request):
 @permission_classes((AllowAny,))
 def list_users(request):
     users = User.objects.all()
-    count = users.count()
-    limit = request.GET.get('limit', 6)
+    if 'cursor' in request.GET:
+        return keyset_response(request, users, UserSerializer)
+    limit = page_size(request.GET.get('limit'), 6)
     offset = request.GET.get('offset', 1)
     paginator = Paginator(users, limit)
     users = paginator.get_page(offset)
     serializer = UserSerializer(instance=users, many=True)
     response = {
-        'count': count,
-        'limit': int(limit),
-        'offset': int(offset),
+        'count': paginator.count,
+        'limit': limit,
+        'offset': users.number,
         'page_count': paginator.num_pages,
         'data': serializer.data
     }
@@ -255,18 +312,21 @@ def list_users(request):
 
 @api_view()
 @permission_classes((AllowAny,))
+@conditional(list_state(*GENRE_MODELS))
+@cache_response(*GENRE_MODELS)
 def list_genres(request):
     genres = Genre.objects.all()
-    count = genres.count()
-    limit = request.GET.get('limit', 6)
+    if 'cursor' in request.GET:
+        return keyset_response(request, genres, GenreSerializer)
+    limit = page_size(request.GET.get('limit'), 6)
     offset = request.GET.get('offset', 1)
     paginator = Paginator(genres, limit)
     genres = paginator.get_page(offset)
     serializer = GenreSerializer(instance=genres, many=True)
     response = {
-        'count': count,
-        'limit': int(limit),
-        'offset': int(offset),
+        'count': paginator.count,
+        'limit': limit,
+        'offset': genres.number,
         'page_count': paginator.num_pages,
         'data': serializer.data
     }
@@ -274,6 +334,8 @@ def list_genres(request):
 
 
 @api_view()
+@conditional(detail_state(Genre))
+@cache_response(*GENRE_MODELS)
 def detail_genre(request, id):
     genre = get_object_or_404(Genre, id=id)
     serializer = GenreSerializer(instance=genre, many=False)
@@ -308,18 +370,21 @@ def delete_genre(request, id):
 
 @api_view()
 @permission_classes((AllowAny,))
+@conditional(list_state(*DIRECTOR_MODELS))
+@cache_response(*DIRECTOR_MODELS)
 def list_directors(request):
     directors = Director.objects.all()
-    count = directors.count()
-    limit = request.GET.get('limit', 2)
+    if 'cursor' in request.GET:
+        return keyset_response(request, directors, DirectorSerializer)
+    limit = page_size(request.GET.get('limit'), 2)
     offset = request.GET.get('offset', 1)
     paginator = Paginator(directors, limit)
     directors = paginator.get_page(offset)
     serializer = DirectorSerializer(instance=directors, many=True)
     response = {
-        'count': count,
-        'limit': int(limit),
-        'offset': int(offset),
+        'count': paginator.count,
+        'limit': limit,
+        'offset': directors.number,
         'page_count': paginator.num_pages,
         'data': serializer.data
     }
@@ -327,6 +392,8 @@ def list_directors(request):
 
 
 @api_view()
+@conditional(detail_state(Director))
+@cache_response(*DIRECTOR_MODELS)
 def detail_director(request, id):
     director = get_object_or_404(Director, id=id)
     serializer = DirectorSerializer(instance=director, many=False)
@@ -0,0 +1,38 @@
+"""
+Process-local copies of small, rarely changing tables.
+
+Each copy remembers the ``apps.versions`` counter it was loaded at and
+reloads once a Genre save or delete has bumped it, so reading the catalog
+costs a cache lookup instead of a query.
+"""
+import threading
+
+from apps.models import Genre
+from apps.versions import get_version
+
+
+class GenreCatalog:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._genres = ()
+
+    def all(self):
+        version = get_version(Genre)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._genres = tuple(Genre.objects.order_by('id'))
+                    self._version = version
+        return self._genres
+
+    def choices(self):
+        return [(genre.id, genre.name) for genre in self.all()]
+
+
+genre_catalog = GenreCatalog()
+
+
+def genre_choices():
+    return genre_catalog.choices()
@@ -0,0 +1,31 @@
+"""
+Comment feed of a movie, newest first.
+
+Pages are keyset paginated on ``(date, id)`` over the
+``comment_movie_date_id_idx`` index, so the detail pages render the first page
+and ``comments_feed`` serves the following ones as JSON, without a ``COUNT(*)``
+or an ``OFFSET``: a page of a movie with 50k comments costs the same as one of a
+movie with ten.
+"""
+from apps.models import Comment
+from apps.paginations import KeysetPaginator, page_size
+
+
+ORDERING = ('-date', '-id')
+FIELDS = ('id', 'name', 'text', 'date')
+PAGE_SIZE = 3
+MAX_PAGE_SIZE = 50
+
+
+def comments_page(movie_id, limit=PAGE_SIZE, cursor=None):
+    """Page of comment dicts after ``cursor``, raises ``InvalidCursor`` on a bad one."""
+    limit = page_size(limit, PAGE_SIZE, MAX_PAGE_SIZE)
+    comments = Comment.objects.filter(movie_id=movie_id).values(*FIELDS)
+    return KeysetPaginator(comments, limit, ORDERING, name='comments').page(cursor)
+
+
+def comment_json(comment):
+    """JSON of a comment dict or instance, as the detail page scripts render it."""
+    if isinstance(comment, Comment):
+        comment = {field: getattr(comment, field) for field in FIELDS}
+    return {**comment, 'date': comment['date'].strftime('%d %B %Y')}
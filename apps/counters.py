@@ -0,0 +1,217 @@
+"""
+Write-behind buffer for ``Movie.views``.
+
+Detail hits only bump a counter in memory (or in a shared cache when
+``VIEW_COUNTER['CACHE_ALIAS']`` is set) and the buffered increments are
+written back as ``UPDATE ... SET views = views + n`` batches every
+``FLUSH_INTERVAL`` seconds, when the worker shuts down and from
+``manage.py flush_views``.
+
+A flush leaves ``updated_at`` and the Movie version alone: view counts are
+approximate anyway, and bumping them every interval would invalidate every
+cached movie response and ETag. Cached responses show counts up to their
+timeout old.
+"""
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import F
+
+from apps.metrics import registry
+from apps.models import Movie
+from apps.routers import detached
+
+
+DEFAULTS = {
+    'FLUSH_INTERVAL': 10,
+    'CACHE_ALIAS': None,
+    'KEY_PREFIX': 'view_counter',
+}
+
+
+flushes = registry.counter('view_counter_flushes_total', 'Write-backs of buffered movie views')
+flushed_views = registry.counter('view_counter_flushed_views_total', 'Movie views written back to the database')
+flush_errors = registry.counter('view_counter_flush_errors_total', 'Failed write-backs, their views were re-buffered')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VIEW_COUNTER', {})}
+
+
+class MemoryBuffer:
+    """Per-process buffer, the default."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+
+    def add(self, movie_id, n=1):
+        with self._lock:
+            self._pending[movie_id] += n
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        return dict(pending)
+
+    def restore(self, pending):
+        for movie_id, n in pending.items():
+            self.add(movie_id, n)
+
+
+class CacheBuffer:
+    """
+    Buffer shared between workers through a Django cache.
+
+    Each movie has its own counter key, so increments are never lost. The
+    first hit of an id since its last flush claims a marker with ``add`` and
+    appends the id to a log numbered with ``incr``, both atomic in every
+    backend; a flush reads the log on from where the previous one stopped.
+    """
+    lock_timeout = 60
+
+    def __init__(self, alias, prefix):
+        self.cache = caches[alias]
+        self.prefix = prefix
+        self._gap = None
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def add(self, movie_id, n=1):
+        key = self._key(movie_id)
+        if not self.cache.add(key, n, timeout=None):
+            self.cache.incr(key, n)
+        # the counter is bumped first, so a flush that unmarks the id after this reads the hit
+        if self.cache.add(self._key(f'dirty:{movie_id}'), 1, timeout=None):
+            self.cache.add(self._key('tail'), 0, timeout=None)
+            position = self.cache.incr(self._key('tail'))
+            self.cache.set(self._key(f'log:{position}'), movie_id, timeout=None)
+
+    def _logged(self):
+        """Ids logged since the last flush, moving the head past them."""
+        start = head = self.cache.get(self._key('head'), 0)
+        tail = self.cache.get(self._key('tail'), 0)
+        keys = [self._key(f'log:{position}') for position in range(start + 1, tail + 1)]
+        logged = self.cache.get_many(keys)
+        ids = set()
+        for position, key in enumerate(keys, start + 1):
+            if key in logged:
+                ids.add(logged[key])
+            elif self._gap != position:
+                # claimed by an add that has not written it yet, wait for it one flush
+                self._gap = position
+                break
+            head = position
+        if head != start:
+            self.cache.set(self._key('head'), head, timeout=None)
+            self.cache.delete_many(keys[:head - start])
+        return ids
+
+    def drain(self):
+        lock = self._key('flushing')
+        if not self.cache.add(lock, 1, timeout=self.lock_timeout):
+            return {}  # another worker is flushing
+        try:
+            ids = self._logged()
+            if not ids:
+                return {}
+            # unmarked before the counters are read, a later hit logs its id again
+            self.cache.delete_many([self._key(f'dirty:{movie_id}') for movie_id in ids])
+            pending = {}
+            for key, n in self.cache.get_many([self._key(movie_id) for movie_id in ids]).items():
+                if not n:
+                    continue
+                movie_id = int(key.rsplit(':', 1)[1])
+                # decr keeps hits that arrived after the read for the next flush
+                self.cache.decr(key, n)
+                pending[movie_id] = n
+            return pending
+        finally:
+            self.cache.delete(lock)
+
+    def restore(self, pending):
+        for movie_id, n in pending.items():
+            self.add(movie_id, n)
+
+
+class ViewCounter:
+
+    def __init__(self):
+        self._buffer = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self.last_flush = time.monotonic()
+
+    @property
+    def buffer(self):
+        if self._buffer is None:
+            config = get_config()
+            if config['CACHE_ALIAS']:
+                self._buffer = CacheBuffer(config['CACHE_ALIAS'], config['KEY_PREFIX'])
+            else:
+                self._buffer = MemoryBuffer()
+        return self._buffer
+
+    @property
+    def interval(self):
+        return get_config()['FLUSH_INTERVAL']
+
+    def increment(self, movie_id, n=1):
+        self.buffer.add(movie_id, n)
+        if time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+        else:
+            self._schedule()
+
+    def flush(self):
+        """Write buffered increments back, one UPDATE per distinct step."""
+        with self._lock:
+            self.last_flush = time.monotonic()
+            pending = self.buffer.drain()
+            if not pending:
+                return 0
+            by_step = defaultdict(list)
+            for movie_id, n in pending.items():
+                by_step[n].append(movie_id)
+            try:
+                # flushed during some request, but not a write of that client
+                with detached():
+                    for n, ids in by_step.items():
+                        Movie.objects.filter(id__in=ids).update(views=F('views') + n)
+            except Exception:
+                self.buffer.restore(pending)
+                flush_errors.inc()
+                raise
+            flushes.inc()
+            flushed_views.inc(sum(pending.values()))
+            return sum(pending.values())
+
+    def _schedule(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(self.interval, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+view_counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_shutdown():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
@@ -0,0 +1,64 @@
+"""
+Denormalized counts: ``Movie.comment_count``, ``Genre.movie_count`` and
+``Director.movie_count``.
+
+``apps.signals`` keeps them current on single writes with atomic ``UPDATE ...
+SET n = n + 1`` statements. Bulk writes, which send no signals, either
+``change`` the rows they touched by what they added (``import_catalog``) or
+``recount`` them, and ``manage.py repair_counts`` recomputes every counter
+to fix any drift.
+
+Like ``Movie.views`` the counters stay out of ``updated_at`` and the model
+versions: a comment would otherwise throw away every cached movie response and
+ETag to refresh one number. Cached responses show counts up to their timeout
+old.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from apps.models import Comment, Director, Genre, Movie
+
+
+# (model, counter field): (counted model, its column pointing at the model)
+COUNTERS = {
+    (Movie, 'comment_count'): (Comment, 'movie_id'),
+    (Genre, 'movie_count'): (Movie.genres.through, 'genre_id'),
+    (Director, 'movie_count'): (Movie, 'director_id'),
+}
+CHUNK_SIZE = 500
+
+
+def change(model, field, ids, delta):
+    """Add ``delta`` to the counter of the ``ids`` rows in one statement."""
+    ids = {id for id in ids if id is not None}
+    if not ids or not delta:
+        return
+    model.objects.filter(id__in=ids).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def actual(model, field):
+    counted, column = COUNTERS[model, field]
+    rows = counted.objects.filter(**{column: OuterRef('pk')}).order_by().values(column)
+    return Coalesce(Subquery(rows.annotate(n=Count('*')).values('n')), Value(0))
+
+
+def drifted(model, field, ids=None):
+    """Ids of the rows (of ``ids``, all by default) whose counter is wrong."""
+    queryset = model.objects.all() if ids is None else model.objects.filter(id__in=ids)
+    return list(queryset.annotate(n=actual(model, field)).exclude(**{field: F('n')}).values_list('id', flat=True))
+
+
+def recount(model, field, ids=None):
+    """Recompute the counter of ``ids`` (all rows by default), returns how many were wrong."""
+    if ids is not None:
+        ids = {id for id in ids if id is not None}
+        if not ids:
+            return 0
+    wrong = drifted(model, field, ids)
+    for start in range(0, len(wrong), CHUNK_SIZE):
+        model.objects.filter(id__in=wrong[start:start + CHUNK_SIZE]).update(**{field: actual(model, field)})
+    return len(wrong)
+
+
+def recount_all():
+    return {f'{model.__name__}.{field}': recount(model, field) for model, field in COUNTERS}
@@ -1,16 +1,18 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
+from apps.counters import view_counter
 from apps.models import Movie
 
 
 def increase_views(func):
 
     def inner(request, id, *args, **kwargs):
-        movie = get_object_or_404(Movie, id=id)
-        if request.user.is_authenticated and movie.author.id == request.user.id:
+        row = Movie.objects.filter(id=id).values_list('author_id').first()
+        if row is None:
+            raise Http404
+        if request.user.is_authenticated and row[0] == request.user.id:
             return func(request, id, *args, **kwargs)
-        movie.views += 1
-        movie.save()
+        view_counter.increment(id)
         return func(request, id, *args, **kwargs)
     
-    return inner
\ No newline at end of file
+    return inner
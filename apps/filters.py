@@ -1,13 +1,17 @@
 import django_filters
 from django import forms
-from apps.models import Movie, Genre
+from apps.catalog import genre_choices
+from apps.models import Movie
 
 
 class MovieFilter(django_filters.FilterSet):
 
     # data_range = django_filters.DateRangeFilter(field_name='date')
-    genres = django_filters.ModelMultipleChoiceFilter(queryset=Genre.objects.all(), widget=forms.CheckboxSelectMultiple)
+    genres = django_filters.MultipleChoiceFilter(choices=genre_choices, widget=forms.CheckboxSelectMultiple)
+    # ?year_min=&year_max=, ?rating_min=&rating_max=, either end may be left out
+    year = django_filters.RangeFilter()
+    rating = django_filters.RangeFilter()
 
     class Meta:
         model = Movie
-        fields = ('genres', 'director', )
\ No newline at end of file
+        fields = ('genres', 'director', 'year', 'rating', )
@@ -1,5 +1,7 @@
 from django import forms
 
+from apps.models import Genre, Movie
+
 
 class LoginForm(forms.Form):
     username = forms.CharField(widget=forms.TextInput(attrs={
@@ -10,3 +12,12 @@ class LoginForm(forms.Form):
         'placeholder': 'Enter password',
         'required': True}))
 
+
+class MovieForm(forms.ModelForm):
+    """Fields of the workspace movie forms, the posters are read from ``request.FILES`` by the views."""
+    # the edit form does not check the current genres, none clears them
+    genres = forms.ModelMultipleChoiceField(queryset=Genre.objects.all(), required=False)
+
+    class Meta:
+        model = Movie
+        fields = ('name', 'overview', 'year', 'rating', 'director', 'genres')
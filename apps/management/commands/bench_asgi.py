@@ -0,0 +1,183 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, make_server
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from apps.management.commands.run_benchmarks import QuietHandler, summarize
+from apps.models import Director, Genre, Movie
+
+
+# name: URL, formatted with ids from the catalog
+ENDPOINTS = {
+    'api_movies': '/api/movies/',
+    'api_movies_cursor': '/api/movies/?cursor=&sort=rating',
+    'api_movie_detail': '/api/movies/{movie}/?expand=director,genres',
+    'api_genres': '/api/genres/',
+    'api_directors': '/api/directors/?page=2',
+}
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server handling requests on a fixed pool of threads, like gunicorn's gthread worker."""
+    request_queue_size = 128
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the read API under WSGI (sync views on a pool of --threads threads) and ASGI '
+        '(async views on uvicorn), one server process each, with the same concurrent clients. '
+        'Reads the current database, run manage.py seed_catalog first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=32, help='Parallel clients')
+        parser.add_argument('--threads', type=int, default=4, help='Request threads of the WSGI process')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Only these, repeatable')
+        parser.add_argument('--cache', action='store_true', help='Keep the API response cache on')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Milliseconds added to every query, to play a database over the network')
+        # internal: run one of the servers in this process
+        parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+        parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options)
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('uvicorn is needed for the ASGI server: pip install uvicorn')
+        movie = Movie.objects.order_by('id').first()
+        if movie is None or not Genre.objects.exists() or Director.objects.count() < 3:
+            raise CommandError('The catalog is too small, run manage.py seed_catalog first')
+        endpoints = {name: ENDPOINTS[name].format(movie=movie.id) for name in options['endpoint'] or ENDPOINTS}
+
+        results = {interface: self.run(interface, endpoints, options) for interface in ('wsgi', 'asgi')}
+        self.stdout.write(f'{"":<20} {"wsgi rps":>9} {"asgi rps":>9} {"wsgi p95":>9} {"asgi p95":>9}')
+        for name in endpoints:
+            wsgi, asgi = results['wsgi'][name], results['asgi'][name]
+            self.stdout.write(
+                f'{name:<20} {wsgi["throughput_rps"]:9.1f} {asgi["throughput_rps"]:9.1f} '
+                f'{wsgi["p95_ms"]:7.1f}ms {asgi["p95_ms"]:7.1f}ms  '
+                f'asgi {asgi["throughput_rps"] / wsgi["throughput_rps"]:.2f}x')
+
+    def serve(self, options):
+        overrides = {
+            'ALLOWED_HOSTS': ['127.0.0.1'],
+            'API_ASYNC_READS': options['serve'] == 'asgi',
+            'DEBUG': False,
+        }
+        if not options['cache']:
+            overrides['API_CACHE'] = {'TIMEOUT': 0}
+        if options['db_latency']:
+            delay = options['db_latency'] / 1000
+
+            def slow(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            def add_latency(connection, **kwargs):
+                # sent again on every reconnect of the same connection object
+                if slow not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(slow)
+            connection_created.connect(add_latency, weak=False)
+        # before the first request, so api.urls picks the views of the interface
+        with override_settings(**overrides):
+            if options['serve'] == 'asgi':
+                import uvicorn
+                from django.core.asgi import get_asgi_application
+
+                uvicorn.run(get_asgi_application(), host='127.0.0.1', port=options['port'],
+                            lifespan='off', log_level='warning', access_log=False)
+            else:
+                from django.core.wsgi import get_wsgi_application
+
+                server = make_server('127.0.0.1', options['port'], get_wsgi_application(),
+                                     server_class=lambda *args, **kwargs: PooledWSGIServer(
+                                         *args, threads=options['threads'], **kwargs),
+                                     handler_class=QuietHandler)
+                server.serve_forever()
+
+    def run(self, interface, endpoints, options):
+        port = free_port()
+        command = [sys.executable, sys.argv[0], 'bench_asgi', '--serve', interface, '--port', str(port),
+                   '--threads', str(options['threads']), '--db-latency', str(options['db_latency'])]
+        if options['cache']:
+            command.append('--cache')
+        server = subprocess.Popen(command, env=os.environ.copy())
+        base = f'http://127.0.0.1:{port}'
+        try:
+            self.wait(server, port)
+
+            def fetch(url):
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(base + url, timeout=60) as response:
+                        response.read()
+                        status = response.status
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                except OSError:
+                    status = 0  # no answer
+                return time.perf_counter() - started, status
+
+            results = {}
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                for name, url in endpoints.items():
+                    list(executor.map(fetch, [url] * options['concurrency']))
+                    started = time.perf_counter()
+                    timings = list(executor.map(fetch, [url] * options['requests']))
+                    elapsed = time.perf_counter() - started
+                    results[name] = summarize(url, [latency for latency, _ in timings], [],
+                                              [status for _, status in timings], elapsed)
+                    if results[name]['statuses'] != [200]:
+                        raise CommandError(f'{interface} {url} answered {results[name]["statuses"]}')
+                    self.stderr.write(f'{interface} {name}: {results[name]["throughput_rps"]} rps')
+            return results
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait(self, server, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('The server exited before it started listening')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('The server did not start listening')
@@ -0,0 +1,114 @@
+import base64
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from PIL import Image
+from rest_framework.test import APIRequestFactory
+
+from api import batch, views
+from apps.models import Director, Genre, Movie
+from apps.storage import poster_storage
+
+
+PASSWORD = 'bench-password'
+
+
+def poster():
+    buffer = BytesIO()
+    Image.new('RGB', (60, 90), 'gray').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare creating objects one request at a time with the batch endpoints. '
+        'Runs against a throwaway test database and media directory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200, help='Objects created per path and resource')
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp(prefix='bench-media-')
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(MEDIA_ROOT=media, API_BATCH_MAX_SIZE=max(options['items'], 1),
+                                   ALLOWED_HOSTS=['testserver']):
+                self.run(options['items'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(media, ignore_errors=True)
+
+    def request(self, method, data, **kwargs):
+        credentials = base64.b64encode(f'{self.user.username}:{PASSWORD}'.encode()).decode()
+        return getattr(self.factory, method)('/', data, HTTP_AUTHORIZATION=f'Basic {credentials}', **kwargs)
+
+    def measure(self, label, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label:<28} {elapsed * 1000:9.1f} ms {len(queries):7} queries')
+        return elapsed
+
+    def compare(self, resource, single, batched):
+        single_time = self.measure(f'{resource} one by one', single)
+        batch_time = self.measure(f'{resource} batch', batched)
+        self.stdout.write(self.style.SUCCESS(f'{resource}: batch is {single_time / batch_time:.1f}x faster'))
+
+    def run(self, items):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('bench', password=PASSWORD)
+        image = poster()
+
+        def check(response, code):
+            assert response.status_code == code, response.data
+
+        self.compare(
+            'genres',
+            lambda: [check(views.GenresGenericAPILIST.as_view()(
+                self.request('post', {'name': f'Single {i}'}, format='json')), 201) for i in range(items)],
+            lambda: check(batch.GenreBatchAPIView.as_view()(
+                self.request('post', [{'name': f'Batch {i}'} for i in range(items)], format='json')), 201),
+        )
+        self.compare(
+            'directors',
+            lambda: [check(views.DirectorsGenericAPIView.as_view()(
+                self.request('post', {'full_name': f'Single {i}'}, format='json')), 201) for i in range(items)],
+            lambda: check(batch.DirectorBatchAPIView.as_view()(
+                self.request('post', [{'full_name': f'Batch {i}'} for i in range(items)], format='json')), 201),
+        )
+
+        director = Director.objects.first()
+        genres = list(Genre.objects.values_list('id', flat=True)[:3])
+        movie = {'year': 2000, 'rating': 7, 'overview': 'Overview', 'director': director.id, 'genres': genres}
+        stored = poster_storage.save('images/poster.png', SimpleUploadedFile('poster.png', image))
+
+        # one by one, posters are uploaded with each movie, a batch refers to stored files
+        self.compare(
+            'movies',
+            lambda: [check(views.add_movie(self.request('post', {
+                **movie, 'name': f'Single {i}',
+                'image': SimpleUploadedFile('poster.png', image),
+                'inner_image': SimpleUploadedFile('poster.png', image),
+            }, format='multipart')), 201) for i in range(items)],
+            lambda: check(batch.MovieBatchAPIView.as_view()(self.request('post', [
+                {**movie, 'name': f'Batch {i}', 'image': stored, 'inner_image': stored} for i in range(items)
+            ], format='json')), 201),
+        )
+        ids = list(Movie.objects.order_by('id').values_list('id', flat=True)[:items])
+
+        self.compare(
+            'movies update',
+            lambda: [check(views.update_movies(
+                self.request('patch', {'name': f'Single {id}'}, format='json'), id=id), 200) for id in ids],
+            lambda: check(batch.MovieBatchAPIView.as_view()(
+                self.request('patch', [{'id': id, 'name': f'Batch {id}'} for id in ids], format='json')), 200),
+        )
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from rest_framework.renderers import JSONRenderer
+
+from api.querysets import eager_load
+from api.serializers import MovieSerializer
+from api.values import ValuesSerializer
+from apps.models import Director, Genre, Movie
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the per-row cost of MovieSerializer and the .values() list path on one large page. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs is reported')
+        parser.add_argument('--fields', default='', help='Like ?fields=')
+        parser.add_argument('--expand', default='', help='Like ?expand=')
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(options['rows'])
+            serializer_options = {
+                option: options[option].split(',') for option in ('fields', 'expand') if options[option]}
+            self.run(options['rows'], options['repeat'], serializer_options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def seed(self, rows):
+        directors = Director.objects.bulk_create([Director(full_name=f'Director {i}') for i in range(100)])
+        genres = Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(20)])
+        movies = Movie.objects.bulk_create([
+            Movie(name=f'Movie {i}', year=2000, rating=i % 10, overview='Overview ' * 100,
+                  image='images/poster.jpg', inner_image='inner_images/poster.jpg',
+                  director=directors[i % len(directors)])
+            for i in range(rows)
+        ])
+        Through = Movie.genres.through
+        Through.objects.bulk_create([
+            Through(movie_id=movie.id, genre_id=genres[(i + offset) % len(genres)].id)
+            for i, movie in enumerate(movies) for offset in range(3)
+        ])
+
+    def measure(self, label, rows, repeat, func):
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                content = func()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f'{label:<20} {best * 1000:9.1f} ms {best / rows * 1e6:8.1f} us/row '
+                          f'{len(queries):4} queries {len(content):10} bytes')
+        return best, content
+
+    def run(self, rows, repeat, options):
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            movies = eager_load(Movie.objects.order_by('id'), MovieSerializer(**options))
+            return renderer.render(MovieSerializer(movies, many=True, **options).data)
+
+        def values_path():
+            serializer = ValuesSerializer(MovieSerializer(**options))
+            return renderer.render(serializer.render(serializer.values(Movie.objects.order_by('id'))))
+
+        slow, expected = self.measure('MovieSerializer', rows, repeat, serializer_path)
+        fast, content = self.measure('values rows', rows, repeat, values_path)
+        if content != expected:
+            self.stderr.write(self.style.ERROR('Outputs differ'))
+        self.stdout.write(self.style.SUCCESS(f'values rows are {slow / fast:.1f}x faster'))
@@ -0,0 +1,82 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from apps.models import Genre, Movie
+
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'apps': 'apps.sessions',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Browse the site like visitors do, with every --login-every-th visitor logging in, and print '
+        'the statements on the session table per 1,000 page views for each session engine. '
+        'The bench user and sessions are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', type=int, default=1000, help='Page views per engine')
+        parser.add_argument('--login-every', type=int, default=10, help='Every nth visitor logs in, 0 for none')
+        parser.add_argument('--engine', action='append', choices=ENGINES, help='Only these, repeatable')
+
+    def handle(self, *args, **options):
+        movie = Movie.objects.order_by('id').first()
+        genre = Genre.objects.order_by('id').first()
+        if movie is None or genre is None:
+            raise CommandError('The catalog is empty, run manage.py seed_catalog first')
+        pages = ['/', f'/movies/{movie.id}/', f'/login/?next=/movies/{movie.id}/', f'/movies/genre/{genre.id}/']
+
+        self.stdout.write(f'{"engine":<8} {"select":>7} {"insert":>7} {"update":>7} {"delete":>7}  per 1,000 views')
+        for name in options['engine'] or ENGINES:
+            overrides = {
+                'ALLOWED_HOSTS': ['testserver'],
+                'SESSION_ENGINE': ENGINES[name],
+                # the hasher is not what is measured
+                'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+            }
+            with override_settings(**overrides):
+                counts = self.browse(pages, options['views'], options['login_every'])
+            per_mille = [counts[kind] * 1000 / options['views'] for kind in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')]
+            self.stdout.write(f'{name:<8} ' + ' '.join(f'{value:7.1f}' for value in per_mille))
+
+    def browse(self, pages, views, login_every):
+        user = User.objects.create_user('bench_sessions', password='bench-sessions')
+        counts = Counter()
+        sessions = set()
+
+        def count(execute, sql, params, many, context):
+            if 'django_session' in sql:
+                counts[sql.split(None, 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        done, visitor = 0, 0
+        try:
+            with connection.execute_wrapper(count):
+                while done < views:
+                    visitor += 1
+                    client = Client()
+                    requests = [(client.get, page, None) for page in pages]
+                    if login_every and visitor % login_every == 0:
+                        requests.insert(3, (client.post, pages[2], {'username': 'bench_sessions',
+                                                                    'password': 'bench-sessions'}))
+                    for method, url, data in requests[:views - done]:
+                        response = method(url, data)
+                        if response.status_code >= 400:
+                            raise CommandError(f'{url} answered {response.status_code}')
+                        done += 1
+                    if settings.SESSION_COOKIE_NAME in client.cookies:
+                        sessions.add(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        finally:
+            Session.objects.filter(session_key__in=sessions).delete()
+            user.delete()
+        return counts
@@ -0,0 +1,100 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps import thumbnails
+from apps.models import Movie
+from apps.storage import poster_storage
+
+
+FIELDS = ('image', 'inner_image')
+
+
+class Command(BaseCommand):
+    help = 'Move existing posters into content-addressed storage, merging identical files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='Delete files under the upload and blob directories that no movie references')
+
+    def digest(self, name):
+        digest = hashlib.sha256()
+        with poster_storage.open(name) as file:
+            for chunk in file.chunks(poster_storage.chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # plain storage, so removing a migrated file skips the reference check
+        raw_storage = FileSystemStorage(location=poster_storage.location)
+
+        names = set()
+        for field in FIELDS:
+            names.update(Movie.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct())
+        legacy = sorted(name for name in names if not poster_storage.is_blob(name))
+
+        renamed = {}
+        digests = set()
+        missing = saved_bytes = 0
+        for name in legacy:
+            if not poster_storage.exists(name):
+                missing += 1
+                self.stderr.write(f'missing: {name}')
+                continue
+            digest = self.digest(name)
+            if digest in digests:
+                saved_bytes += poster_storage.size(name)
+            digests.add(digest)
+            if dry_run:
+                continue
+            with poster_storage.open(name) as file:
+                renamed[name] = poster_storage.save(name, file)
+
+        if not dry_run:
+            with transaction.atomic():
+                for old, new in renamed.items():
+                    for field in FIELDS:
+                        Movie.objects.filter(**{field: old}).update(**{field: new, f'{field}_derivatives': {}})
+            for old in renamed:
+                raw_storage.delete(old)
+                thumbnails.delete(old)
+            # a legacy file shared by several rows was saved once
+            poster_storage.recount()
+
+        orphans = []
+        upload_dirs = {Movie._meta.get_field(field).upload_to.rstrip('/') for field in FIELDS}
+        upload_dirs.add(poster_storage.prefix)
+        referenced = names | set(renamed.values())
+        for directory in upload_dirs:
+            if not os.path.isdir(poster_storage.path(directory)):
+                continue
+            for root, _, files in os.walk(poster_storage.path(directory)):
+                for file in files:
+                    name = os.path.relpath(os.path.join(root, file), poster_storage.location).replace(os.sep, '/')
+                    if name not in referenced:
+                        orphans.append(name)
+        orphans = [name for name in orphans if raw_storage.exists(name)]
+        if options['delete_orphans'] and not dry_run:
+            for name in orphans:
+                size = raw_storage.size(name)
+                if poster_storage.is_blob(name):
+                    # a blob referenced since it was listed is kept
+                    if not poster_storage.purge(name):
+                        continue
+                    thumbnails.delete(name)
+                else:
+                    raw_storage.delete(name)
+                saved_bytes += size
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{len(legacy)} legacy files, {len(digests)} distinct blobs, {missing} missing, '
+            f'{len(orphans)} unreferenced files{" deleted" if options["delete_orphans"] and not dry_run else ""}, '
+            f'{saved_bytes} bytes saved'))
+        if renamed:
+            self.stdout.write('Run manage.py generate_thumbnails to render derivatives of the new blobs')
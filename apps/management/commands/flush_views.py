@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.counters import view_counter, get_config
+
+
+class Command(BaseCommand):
+    help = 'Write buffered movie view counts back to the database'
+
+    def handle(self, *args, **options):
+        if not get_config()['CACHE_ALIAS']:
+            self.stdout.write(self.style.WARNING(
+                'VIEW_COUNTER has no CACHE_ALIAS, only this process\'s buffer can be flushed'))
+        flushed = view_counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} views'))
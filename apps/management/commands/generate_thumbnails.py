@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from apps import thumbnails
+from apps.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG/WebP derivatives of all movie posters and record them on the movies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=thumbnails.get_config()['WORKERS'])
+        parser.add_argument('--force', action='store_true', help='Re-render existing derivatives')
+
+    def handle(self, *args, **options):
+        names = set()
+        for image, inner_image in Movie.objects.values_list('image', 'inner_image').iterator():
+            names.update(name for name in (image, inner_image) if name)
+
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(thumbnails.generate, name, options['force']): name for name in names}
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} images, {written} derivatives written, {failed} failed'))
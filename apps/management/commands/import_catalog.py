@@ -0,0 +1,158 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from apps import counts, search
+from apps.models import Director, Genre, Movie
+from apps.storage import poster_storage
+from apps.versions import bump_version
+
+
+MOVIE_FIELDS = ('name', 'year', 'rating', 'overview', 'image', 'inner_image')
+POSTER_FIELDS = ('image', 'inner_image')
+# integer fields and their allowed range
+NUMBER_FIELDS = {'year': (0, 32767), 'rating': (0, 100)}
+
+
+def read_csv(file, genre_separator):
+    for row in csv.DictReader(file):
+        genres = row.get('genres') or ''
+        row['genres'] = [genre.strip() for genre in genres.split(genre_separator) if genre.strip()]
+        yield row
+
+
+def read_jsonl(file, genre_separator):
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        genres = row.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(genre_separator)
+        row['genres'] = [genre.strip() for genre in genres if genre.strip()]
+        yield row
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import movies from a CSV or JSONL file with the columns '
+        'name, year, rating, overview, image, inner_image, director and genres'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" for stdin')
+        parser.add_argument('--format', choices=READERS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Movies per INSERT and transaction')
+        parser.add_argument('--genre-separator', default='|')
+        parser.add_argument('--dry-run', action='store_true', help='Parse and validate without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in READERS:
+            raise CommandError(f'Unknown format "{fmt}", pass --format')
+
+        self.directors = dict(Director.objects.values_list('full_name', 'id'))
+        self.genres = {}
+        for id, name in Genre.objects.order_by('id').values_list('id', 'name'):
+            self.genres.setdefault(name, id)
+        self.dry_run = options['dry_run']
+        self.new_directors = set()
+        self.new_genres = set()
+
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.monotonic()
+        total = 0
+        try:
+            rows = READERS[fmt](file, options['genre_separator'])
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch, total)
+                total += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{total} rows, {total / elapsed:.0f} rows/s')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        if not self.dry_run and total:
+            for model in (Movie, Director, Genre):
+                bump_version(model)
+        elapsed = time.monotonic() - started
+        prefix = '[dry run] ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{total} movies, {len(self.new_directors)} new directors, '
+            f'{len(self.new_genres)} new genres in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'))
+
+    def validate(self, row, line):
+        missing = [field for field in MOVIE_FIELDS + ('director',) if not row.get(field)]
+        if missing:
+            raise CommandError(f'Row {line}: missing {", ".join(missing)}')
+        for field, (low, high) in NUMBER_FIELDS.items():
+            try:
+                row[field] = int(row[field])
+            except (TypeError, ValueError):
+                raise CommandError(f'Row {line}: {field} must be an integer')
+            if not low <= row[field] <= high:
+                raise CommandError(f'Row {line}: {field} must be between {low} and {high}')
+
+    def import_batch(self, batch, offset):
+        for line, row in enumerate(batch, start=offset + 1):
+            self.validate(row, line)
+        director_names = {row['director'] for row in batch} - self.directors.keys()
+        genre_names = {genre for row in batch for genre in row['genres']} - self.genres.keys()
+        self.new_directors |= director_names
+        self.new_genres |= genre_names
+        if self.dry_run:
+            self.directors.update(dict.fromkeys(director_names))
+            self.genres.update(dict.fromkeys(genre_names))
+            return
+
+        with transaction.atomic():
+            if director_names:
+                Director.objects.bulk_create([Director(full_name=name) for name in director_names],
+                                             ignore_conflicts=True)
+                self.directors.update(Director.objects.filter(full_name__in=director_names)
+                                      .values_list('full_name', 'id'))
+            if genre_names:
+                for genre in Genre.objects.bulk_create([Genre(name=name) for name in genre_names]):
+                    self.genres[genre.name] = genre.id
+
+            movies = Movie.objects.bulk_create([
+                Movie(director_id=self.directors[row['director']], **{field: row[field] for field in MOVIE_FIELDS})
+                for row in batch
+            ])
+            Through = Movie.genres.through
+            links = Through.objects.bulk_create([
+                Through(movie_id=movie.id, genre_id=self.genres[genre])
+                for movie, row in zip(movies, batch)
+                for genre in dict.fromkeys(row['genres'])
+            ])
+            try:
+                poster_storage.retain(*(row[field] for row in batch for field in POSTER_FIELDS))
+            except IntegrityError as e:
+                raise CommandError(f'Rows {offset + 1}-{offset + len(batch)}: {e}')
+            search.index_movies([movie.id for movie in movies])
+            add_counts(Director, Counter(movie.director_id for movie in movies))
+            add_counts(Genre, Counter(link.genre_id for link in links))
+
+
+def add_counts(model, added):
+    """Add the batch's movies to ``movie_count``, one UPDATE per distinct number added."""
+    ids = defaultdict(list)
+    for id, n in added.items():
+        ids[n].append(id)
+    for n, group in ids.items():
+        counts.change(model, 'movie_count', group, n)
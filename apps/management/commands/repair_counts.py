@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps import counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the comment and movie counters of movies, genres and directors and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the rows that are wrong')
+
+    def handle(self, *args, **options):
+        for model, field in counts.COUNTERS:
+            label = f'{model.__name__}.{field}'
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {len(counts.drifted(model, field))} rows wrong')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label}: {counts.recount(model, field)} rows fixed'))
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import time
+from urllib.parse import unquote, urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.routers import get_config
+
+
+def replica_file(alias):
+    name = str(connections[alias].settings_dict['NAME'])
+    return unquote(urlparse(name).path) if name.startswith('file:') else name
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over each replica of DATABASE_ROUTING, once or every '
+        '--interval seconds. Each copy is swapped in whole, readers see the old or the new file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Seconds between copies, 0 copies once')
+
+    def handle(self, *args, **options):
+        replicas = get_config()['REPLICAS']
+        if not replicas:
+            raise CommandError('No replicas, set DATABASE_REPLICAS')
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in replicas):
+            raise CommandError('Only SQLite databases are copied, use the replication of your database server')
+        while True:
+            started = time.perf_counter()
+            source.ensure_connection()
+            for alias in replicas:
+                self.copy(source.connection, replica_file(alias))
+            source.close()
+            self.stdout.write(f'Copied to {len(replicas)} replicas in {(time.perf_counter() - started) * 1000:.0f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source, path):
+        partial = f'{path}.partial'
+        target = sqlite3.connect(partial)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+        os.replace(partial, path)
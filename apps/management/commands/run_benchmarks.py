@@ -0,0 +1,205 @@
+import json
+import math
+import platform
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.models import Comment, Director, Genre, Movie
+
+
+# name: URL, formatted with ids from the catalog
+ENDPOINTS = {
+    'main': '/',
+    'main_rating': '/?sort=rating',
+    'search': '/?search={word}',
+    'detail': '/movies/{movie}/',
+    'movies_by_genre': '/movies/genre/{genre}/',
+    'api_movies': '/api/movies/',
+    'api_movies_cursor': '/api/movies/?cursor=&sort=rating',
+    'api_movies_sparse': '/api/movies/?fields=id,name,image',
+    'api_movie_detail': '/api/movies/{movie}/?expand=director,genres',
+    'api_genres': '/api/genres/',
+    'api_directors': '/api/directors/',
+}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(url, latencies, queries, statuses, elapsed):
+    return {
+        'url': url,
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'max_queries': max(queries) if queries else None,
+        'statuses': sorted(set(statuses)),
+    }
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main HTML and API pages through the test client and a local WSGI server and '
+        'print p50/p95/p99 latency, throughput and query counts per endpoint as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint')
+        parser.add_argument('--transport', choices=('client', 'wsgi', 'both'), default='both')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests against the WSGI server')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Only these, repeatable')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the API response cache')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--compare', help='Previous JSON report to print p50/p95 changes against')
+
+    def handle(self, *args, **options):
+        movie = Movie.objects.order_by('id').first()
+        genre = Genre.objects.order_by('id').first()
+        if movie is None or genre is None:
+            raise CommandError('The catalog is empty, run manage.py seed_catalog first')
+        ids = {'movie': movie.id, 'genre': genre.id, 'word': movie.name.split()[0]}
+        endpoints = {name: ENDPOINTS[name].format(**ids) for name in options['endpoint'] or ENDPOINTS}
+
+        overrides = {'ALLOWED_HOSTS': ['testserver', '127.0.0.1', 'localhost']}
+        if options['no_cache']:
+            overrides['API_CACHE'] = {'TIMEOUT': 0}
+        results = {}
+        with override_settings(**overrides):
+            if options['transport'] in ('client', 'both'):
+                results['client'] = self.run_client(endpoints, options['requests'], options['warmup'])
+            if options['transport'] in ('wsgi', 'both'):
+                results['wsgi'] = self.run_wsgi(endpoints, options['requests'], options['warmup'],
+                                                options['concurrency'])
+
+        report = {'meta': self.meta(options), 'results': results}
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(content + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(content)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file), report)
+
+    def meta(self, options):
+        try:
+            revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                      text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        return {
+            'revision': revision,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'catalog': {model.__name__.lower(): model.objects.count() for model in (Movie, Director, Genre, Comment)},
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'cache': not options['no_cache'],
+        }
+
+    def run_client(self, endpoints, requests, warmup):
+        client = Client()
+        results = {}
+        for name, url in endpoints.items():
+            for _ in range(warmup):
+                client.get(url)
+            latencies, queries, statuses = [], [], []
+            started = time.perf_counter()
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as captured:
+                    request_started = time.perf_counter()
+                    response = client.get(url)
+                    latencies.append(time.perf_counter() - request_started)
+                queries.append(len(captured))
+                statuses.append(response.status_code)
+            results[name] = summarize(url, latencies, queries, statuses, time.perf_counter() - started)
+            self.stderr.write(f'client {name}: p50 {results[name]["p50_ms"]} ms')
+        return results
+
+    def run_wsgi(self, endpoints, requests, warmup, concurrency):
+        queries = {}
+        application = get_wsgi_application()
+
+        def counting_application(environ, start_response):
+            # each request runs on its own server thread and database connection
+            with CaptureQueriesContext(connection) as captured:
+                body = b''.join(application(environ, start_response))
+            queries.setdefault(environ['PATH_INFO'] + '?' + environ.get('QUERY_STRING', ''), []).append(len(captured))
+            return [body]
+
+        server = make_server('127.0.0.1', 0, counting_application,
+                             server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base = f'http://127.0.0.1:{server.server_port}'
+
+        def fetch(url):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base + url) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            return time.perf_counter() - started, status
+
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for name, url in endpoints.items():
+                    list(executor.map(fetch, [url] * warmup))
+                    queries.clear()
+                    started = time.perf_counter()
+                    timings = list(executor.map(fetch, [url] * requests))
+                    elapsed = time.perf_counter() - started
+                    key = url if '?' in url else url + '?'
+                    results[name] = summarize(url, [latency for latency, _ in timings], queries.get(key, []),
+                                              [status for _, status in timings], elapsed)
+                    self.stderr.write(f'wsgi {name}: p50 {results[name]["p50_ms"]} ms')
+        finally:
+            server.shutdown()
+            server.server_close()
+        return results
+
+    def compare(self, old, new):
+        for transport, endpoints in new['results'].items():
+            for name, result in endpoints.items():
+                before = old.get('results', {}).get(transport, {}).get(name)
+                if not before:
+                    continue
+                changes = ', '.join(
+                    f'{key} {before[key]} -> {result[key]} ({(result[key] - before[key]) / before[key] * 100:+.0f}%)'
+                    for key in ('p50_ms', 'p95_ms') if before[key])
+                self.stderr.write(f'{transport} {name}: {changes}, queries {before["max_queries"]} -> {result["max_queries"]}')
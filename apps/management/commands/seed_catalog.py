@@ -0,0 +1,121 @@
+import random
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from apps import counts, search
+from apps.models import Comment, Director, Genre, Movie
+from apps.storage import poster_storage
+from apps.versions import bump_version
+
+
+WORDS = (
+    'night', 'city', 'last', 'summer', 'river', 'ghost', 'winter', 'star', 'road', 'house', 'war', 'love',
+    'silent', 'king', 'garden', 'iron', 'shadow', 'island', 'fire', 'dream', 'storm', 'glass', 'wolf', 'sea',
+)
+FIRST_NAMES = ('Anna', 'Boris', 'Chen', 'Dina', 'Emil', 'Farida', 'Gleb', 'Hana', 'Ivan', 'Jamila', 'Kemal', 'Lina')
+LAST_NAMES = ('Abdyldaev', 'Berg', 'Costa', 'Dzhumaev', 'Evans', 'Fischer', 'Garcia', 'Hadzhi', 'Ivanova', 'Kim')
+MAX_MOVIES = 1_000_000
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a deterministic synthetic catalog of directors, genres, movies, '
+        'genre links and comments; the same --seed and sizes always give the same rows'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=1000, help=f'1 to {MAX_MOVIES}')
+        parser.add_argument('--directors', type=int, help='Defaults to movies / 10')
+        parser.add_argument('--genres', type=int, default=20)
+        parser.add_argument('--genres-per-movie', type=int, default=3)
+        parser.add_argument('--comments-per-movie', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT and transaction')
+        parser.add_argument('--clear', action='store_true', help='Delete the existing catalog first')
+
+    def handle(self, *args, **options):
+        movies = options['movies']
+        if not 1 <= movies <= MAX_MOVIES:
+            raise CommandError(f'--movies must be between 1 and {MAX_MOVIES}')
+        seed = options['seed']
+        # one stream per table, so the rows don't depend on the batch size
+        director_random = random.Random(f'{seed}-directors')
+        movie_random = random.Random(f'{seed}-movies')
+        genre_random = random.Random(f'{seed}-genres')
+        comment_random = random.Random(f'{seed}-comments')
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        if options['clear']:
+            # raw deletes: no per-row signals, so shared poster files stay
+            with transaction.atomic():
+                for model in (Comment, Movie.genres.through, Movie, Director, Genre):
+                    model.objects.all()._raw_delete(model.objects.db)
+            search.rebuild_index()
+        elif Movie.objects.exists() or Director.objects.exists():
+            raise CommandError('The catalog is not empty, pass --clear to replace it')
+
+        poster = self.poster(seed)
+        genre_ids = [genre.id for genre in Genre.objects.bulk_create(
+            [Genre(name=f'{self.title(1, genre_random)} {i}') for i in range(options['genres'])])]
+        director_count = options['directors'] or max(movies // 10, 1)
+        director_ids = []
+        for start in range(0, director_count, self.batch_size):
+            director_ids += [director.id for director in Director.objects.bulk_create([
+                Director(full_name=f'{director_random.choice(FIRST_NAMES)} {director_random.choice(LAST_NAMES)} {i}')
+                for i in range(start, min(start + self.batch_size, director_count))
+            ])]
+
+        per_movie = min(options['genres_per_movie'], len(genre_ids))
+        Through = Movie.genres.through
+        for start in range(0, movies, self.batch_size):
+            count = min(self.batch_size, movies - start)
+            with transaction.atomic():
+                created = Movie.objects.bulk_create([
+                    Movie(name=self.title(movie_random.randint(1, 4), movie_random),
+                          year=movie_random.randint(1950, 2024), rating=movie_random.randint(0, 100),
+                          overview=self.sentence(40, movie_random), image=poster, inner_image=poster,
+                          views=int(movie_random.paretovariate(1.2)) - 1,
+                          director_id=movie_random.choice(director_ids),
+                          comment_count=options['comments_per_movie'])
+                    for _ in range(count)
+                ])
+                Through.objects.bulk_create([
+                    Through(movie_id=movie.id, genre_id=genre_id)
+                    for movie in created for genre_id in genre_random.sample(genre_ids, per_movie)
+                ])
+                Comment.objects.bulk_create([
+                    Comment(name=f'{comment_random.choice(FIRST_NAMES)} {comment_random.choice(LAST_NAMES)}',
+                            text=self.sentence(comment_random.randint(5, 60), comment_random), movie_id=movie.id)
+                    for movie in created for _ in range(options['comments_per_movie'])
+                ])
+                search.index_movies([movie.id for movie in created])
+            self.stdout.write(f'{start + count} movies, {(start + count) / (time.monotonic() - started):.0f} rows/s')
+
+        counts.recount(Director, 'movie_count')
+        counts.recount(Genre, 'movie_count')
+        # the raw deletes and bulk inserts skipped the poster reference counts
+        poster_storage.recount()
+        for model in (Movie, Director, Genre):
+            bump_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {movies} movies, {director_count} directors, {len(genre_ids)} genres and '
+            f'{movies * options["comments_per_movie"]} comments in {time.monotonic() - started:.1f}s'))
+
+    def title(self, words, stream):
+        return ' '.join(stream.choice(WORDS) for _ in range(words)).capitalize()
+
+    def sentence(self, words, stream):
+        return self.title(words, stream) + '.'
+
+    def poster(self, seed):
+        """One shared placeholder poster; content addressed, so reseeding reuses the blob."""
+        color = random.Random(seed).choices(range(256), k=3)
+        buffer = BytesIO()
+        Image.new('RGB', (300, 450), tuple(color)).save(buffer, 'JPEG', quality=80)
+        return poster_storage.save('images/seed.jpg', ContentFile(buffer.getvalue()))
@@ -0,0 +1,248 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Modules register counters and fixed-bucket histograms on ``registry`` and
+``MetricsMiddleware`` observes latency, status and query count per resolved URL
+name. With ``METRICS['DIRECTORY']`` set, every worker writes a snapshot of its
+registry to ``<DIRECTORY>/<pid>.json`` (at most every ``WRITE_INTERVAL``
+seconds and at exit) and the endpoint sums the snapshots of all workers. The
+directory should be emptied when the service is redeployed.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from apps.middleware import QueryHookMiddleware
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULTS = {
+    'DIRECTORY': None,
+    'WRITE_INTERVAL': 5,  # seconds
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def describe(self):
+        return {'type': self.type, 'help': self.help, 'labels': self.labels}
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.describe(), 'samples': [[list(key), value] for key, value in self.values.items()]}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def describe(self):
+        return {**super().describe(), 'buckets': self.buckets}
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            # per bucket counts (not cumulative), then sum and count
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * len(self.buckets) + [0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.describe(), 'samples': [[list(key), list(value)] for key, value in self.values.items()]}
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self.last_write = 0
+
+    def register(self, cls, name, help, **kwargs):
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter, name, help, labels=labels)
+
+    def histogram(self, name, help, labels=(), buckets=()):
+        return self.register(Histogram, name, help, labels=labels, buckets=buckets)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    def write(self, directory):
+        """Atomically replace this process's snapshot in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        self.last_write = time.monotonic()
+        fd, path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+
+    def maybe_write(self):
+        config = get_config()
+        if config['DIRECTORY'] and time.monotonic() - self.last_write >= config['WRITE_INTERVAL']:
+            self.write(config['DIRECTORY'])
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """Sum the samples of several snapshots by metric and labels."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'samples': {}})
+            for key, value in metric['samples']:
+                key = tuple(key)
+                if isinstance(value, list):
+                    current = target['samples'].get(key) or [0] * len(value)
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+    return merged
+
+
+def collect():
+    """Merged metrics of this process, or of every worker in ``METRICS['DIRECTORY']``."""
+    directory = get_config()['DIRECTORY']
+    if not directory:
+        return merge([registry.snapshot()])
+    registry.write(directory)
+    snapshots = []
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, file_name)) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+    return merge(snapshots)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(metrics=None):
+    """Prometheus text exposition of ``metrics`` (default: ``collect()``)."""
+    metrics = collect() if metrics is None else metrics
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for key, value in sorted(metric['samples'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{_labels(metric["labels"], key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'], value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(metric["labels"], key, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(metric["labels"], key, [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_labels(metric["labels"], key)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(metric["labels"], key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by URL name', labels=('view', 'method'),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+request_queries = registry.histogram(
+    'http_request_queries', 'Database queries per request by URL name', labels=('view',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+responses = registry.counter('http_responses_total', 'Responses by URL name and status', labels=('view', 'status'))
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def execute(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route
+
+
+class MetricsMiddleware(QueryHookMiddleware):
+
+    def start(self, request):
+        return QueryCounter()
+
+    def finish(self, request, response, queries):
+        view = view_name(request)
+        request_duration.observe(time.perf_counter() - queries.started, view=view, method=request.method)
+        request_queries.observe(queries.count, view=view)
+        responses.inc(view=view, status=response.status_code)
+        registry.maybe_write()
+        return response
+
+
+@atexit.register
+def _write_on_shutdown():
+    directory = get_config()['DIRECTORY']
+    if directory:
+        try:
+            registry.write(directory)
+        except OSError:
+            pass
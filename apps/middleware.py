@@ -0,0 +1,76 @@
+"""
+Base of the middleware that hook into every query of a request.
+
+Every database connection gets one permanent ``execute_wrapper``
+(``apps.signals`` installs it when the connection opens) that passes each
+query through the hooks of the current request, kept in a context variable.
+Context variables follow the request into the thread where the ORM of an async
+view runs, so the same middleware serve WSGI and ASGI without entering
+wrappers on that thread's connections, which would cost a thread switch.
+"""
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+_hooks = ContextVar('query_hooks', default=())
+
+
+def run_hooks(execute, sql, params, many, context):
+    hooks = _hooks.get()
+    for hook in reversed(hooks):
+        execute = partial(hook, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if run_hooks not in connection.execute_wrappers:
+        connection.execute_wrappers.append(run_hooks)
+
+
+class QueryHookMiddleware(ABC):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @abstractmethod
+    def start(self, request):
+        """State of the request, with the ``execute`` wrapper of its queries, ``None`` to skip it."""
+
+    def finish(self, request, response, state):
+        return response
+
+    def close(self, state):
+        """Called after the response, also when the view raised."""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        if state is None:
+            return self.get_response(request)
+        token = _hooks.set((*_hooks.get(), state.execute))
+        try:
+            response = self.get_response(request)
+        finally:
+            _hooks.reset(token)
+            self.close(state)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        if state is None:
+            return await self.get_response(request)
+        token = _hooks.set((*_hooks.get(), state.execute))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _hooks.reset(token)
+            self.close(state)
+        return self.finish(request, response, state)
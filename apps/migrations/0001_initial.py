@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:19
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Actor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('full_name', models.CharField(max_length=150, unique=True, verbose_name='имя актера')),
+            ],
+            options={
+                'verbose_name': 'Актер',
+                'verbose_name_plural': 'Актеры',
+            },
+        ),
+        migrations.CreateModel(
+            name='Director',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('full_name', models.CharField(max_length=150, unique=True, verbose_name='имя режиссёра')),
+            ],
+            options={
+                'verbose_name': 'Режиссёр',
+                'verbose_name_plural': 'Режиссёры',
+            },
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Жанр',
+                'verbose_name_plural': 'Жанры',
+            },
+        ),
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='название')),
+                ('year', models.ImageField(upload_to='', verbose_name='год выпуска')),
+                ('rating', models.ImageField(upload_to='', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)], verbose_name='рейтинг')),
+                ('image', models.ImageField(upload_to='images/', verbose_name='обложка')),
+                ('inner_image', models.ImageField(upload_to='inner_images/', verbose_name='внутренная обложка')),
+                ('overview', models.CharField(max_length=1000, verbose_name='Краткое описание')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='просмотры')),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='автор')),
+                ('director', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movies', to='apps.director', verbose_name='Режиссёр')),
+                ('genres', models.ManyToManyField(related_name='movies', to='apps.genre', verbose_name='Жанры')),
+            ],
+            options={
+                'verbose_name': 'Фильм',
+                'verbose_name_plural': 'Фильмы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Имя и фамилия')),
+                ('text', models.TextField(verbose_name='текст')),
+                ('date', models.DateField(auto_now_add=True, verbose_name='дата добавление')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='apps.movie', verbose_name='Фильм')),
+            ],
+            options={
+                'verbose_name': 'Коментарий',
+                'verbose_name_plural': 'Коментарий',
+            },
+        ),
+    ]
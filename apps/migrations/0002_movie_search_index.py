@@ -0,0 +1,43 @@
+from django.db import migrations, OperationalError
+
+
+TABLE = 'apps_movie_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                "name, overview, director, genres, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5, apps.search falls back to LIKE
+            return
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, overview, director, genres) '
+            'SELECT m.id, m.name, m.overview, d.full_name, '
+            '(SELECT group_concat(g.name, \' \') FROM apps_movie_genres mg '
+            'JOIN apps_genre g ON g.id = mg.genre_id WHERE mg.movie_id = m.id) '
+            'FROM apps_movie m JOIN apps_director d ON d.id = m.director_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
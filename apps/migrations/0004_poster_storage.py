@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:26
+
+import apps.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='image',
+            field=models.ImageField(storage=apps.storage.get_poster_storage, upload_to='images/', verbose_name='обложка'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='inner_image',
+            field=models.ImageField(storage=apps.storage.get_poster_storage, upload_to='inner_images/', verbose_name='внутренная обложка'),
+        ),
+    ]
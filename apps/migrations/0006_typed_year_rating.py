@@ -0,0 +1,118 @@
+import re
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def parse(value, high):
+    """Leading number of a stored ``year``/``rating`` string, ``None`` when there is none or it is out of range."""
+    match = re.search(r'\d+(?:[.,]\d+)?', value or '')
+    if not match:
+        return None
+    number = round(float(match.group().replace(',', '.')))
+    return number if 0 <= number <= high else None
+
+
+def copy_to_numbers(apps, schema_editor):
+    Movie = apps.get_model('apps', 'Movie')
+    movies = list(Movie.objects.only('year', 'rating'))
+    invalid = []
+    for movie in movies:
+        movie.year_number = parse(str(movie.year), 32767)
+        movie.rating_number = parse(str(movie.rating), 100)
+        if movie.year_number is None:
+            invalid.append(f'movie {movie.id}: year {str(movie.year)!r}')
+        if movie.rating_number is None:
+            invalid.append(f'movie {movie.id}: rating {str(movie.rating)!r}')
+    if invalid:
+        # nothing is written, fix these rows and migrate again
+        raise ValueError(
+            f'{len(invalid)} year/rating values are not numbers in range (year 0-32767, rating 0-100):\n'
+            + '\n'.join(invalid))
+    Movie.objects.bulk_update(movies, ['year_number', 'rating_number'], batch_size=1000)
+
+
+def copy_to_strings(apps, schema_editor):
+    Movie = apps.get_model('apps', 'Movie')
+    movies = list(Movie.objects.only('year_number', 'rating_number'))
+    for movie in movies:
+        movie.year = str(movie.year_number)
+        movie.rating = str(movie.rating_number)
+    Movie.objects.bulk_update(movies, ['year', 'rating'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    """
+    ``year`` and ``rating`` were image fields holding numbers as varchar paths.
+    The values are parsed into new small integer columns which then replace them;
+    a value that is not a number in range stops the migration and lists its row.
+    """
+
+    dependencies = [
+        ('apps', '0005_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movie',
+            name='movie_rating_id_idx',
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='year_number',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_number',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_to_numbers, copy_to_strings),
+        # defaults only matter when migrating back, to re-add the varchar columns
+        migrations.AlterField(
+            model_name='movie',
+            name='year',
+            field=models.ImageField(default='', upload_to='', verbose_name='год выпуска'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='rating',
+            field=models.ImageField(default='', upload_to='', verbose_name='рейтинг'),
+        ),
+        migrations.RemoveField(
+            model_name='movie',
+            name='year',
+        ),
+        migrations.RemoveField(
+            model_name='movie',
+            name='rating',
+        ),
+        migrations.RenameField(
+            model_name='movie',
+            old_name='year_number',
+            new_name='year',
+        ),
+        migrations.RenameField(
+            model_name='movie',
+            old_name='rating_number',
+            new_name='rating',
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='year',
+            field=models.PositiveSmallIntegerField(verbose_name='год выпуска'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='rating',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)], verbose_name='рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['rating', 'id'], name='movie_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['year'], name='movie_year_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count(model, column):
+    rows = model.objects.filter(**{column: OuterRef('pk')}).order_by().values(column)
+    return Coalesce(Subquery(rows.annotate(n=Count('*')).values('n')), Value(0))
+
+
+def fill_counts(apps, schema_editor):
+    Movie = apps.get_model('apps', 'Movie')
+    Movie.objects.update(comment_count=count(apps.get_model('apps', 'Comment'), 'movie_id'))
+    apps.get_model('apps', 'Genre').objects.update(movie_count=count(Movie.genres.through, 'genre_id'))
+    apps.get_model('apps', 'Director').objects.update(movie_count=count(Movie, 'director_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0006_typed_year_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='director',
+            name='movie_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='фильмы'),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='movie_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='фильмы'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='комментарии'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0007_counter_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='image_derivatives',
+            field=models.JSONField(default=dict, editable=False, verbose_name='размеры обложки'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='inner_image_derivatives',
+            field=models.JSONField(default=dict, editable=False, verbose_name='размеры внутренней обложки'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:33
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Movie = apps.get_model('apps', 'Movie')
+    PosterBlob = apps.get_model('apps', 'PosterBlob')
+    counts = Counter()
+    for field in ('image', 'inner_image'):
+        rows = (Movie.objects.filter(**{f'{field}__startswith': 'posters/'})
+                .values_list(field).annotate(references=models.Count('pk')).order_by())
+        for name, references in rows:
+            counts[name] += references
+    PosterBlob.objects.bulk_create(
+        [PosterBlob(name=name, references=references) for name, references in counts.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0008_poster_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='ссылки')),
+            ],
+            options={
+                'verbose_name': 'Файл обложки',
+                'verbose_name_plural': 'Файлы обложек',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
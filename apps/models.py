@@ -1,6 +1,8 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from apps.storage import get_poster_storage
+
 class Actor(models.Model):
     class Meta:
         verbose_name = 'Актер'
@@ -19,6 +21,9 @@ class Director(models.Model):
         verbose_name_plural = 'Режиссёры'
 
     full_name = models.CharField(verbose_name = 'имя режиссёра', max_length=150, unique=True)
+    # maintained by apps.counts
+    movie_count = models.PositiveIntegerField('фильмы', default=0, editable=False)
+    updated_at = models.DateTimeField(verbose_name='дата изменения', auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.full_name}'
@@ -31,27 +36,55 @@ class Genre(models.Model):
         verbose_name_plural = 'Жанры'
 
     name = models.CharField(max_length=100)
+    movie_count = models.PositiveIntegerField('фильмы', default=0, editable=False)
+    updated_at = models.DateTimeField(verbose_name='дата изменения', auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.name}'
 
 
+class PosterBlob(models.Model):
+    """Reference count of a poster file in ``apps.storage.ContentAddressedStorage``."""
+
+    class Meta:
+        verbose_name = 'Файл обложки'
+        verbose_name_plural = 'Файлы обложек'
+
+    name = models.CharField('файл', max_length=100, primary_key=True)
+    references = models.PositiveIntegerField('ссылки', default=0)
+
+    def __str__(self):
+        return f'{self.name} - {self.references}'
+
+
 class Movie(models.Model):
 
     class Meta:
         verbose_name = 'Фильм'
         verbose_name_plural = 'Фильмы'
+        indexes = [
+            # keyset orderings of MOVIE_ORDERINGS, id breaks ties
+            models.Index(fields=['rating', 'id'], name='movie_rating_id_idx'),
+            models.Index(fields=['views', 'id'], name='movie_views_id_idx'),
+            models.Index(fields=['name'], name='movie_name_idx'),
+            models.Index(fields=['year'], name='movie_year_idx'),
+        ]
 
     name = models.CharField(max_length=100, verbose_name='название')
-    year = models.ImageField(verbose_name='год выпуска')
-    rating = models.ImageField(verbose_name='рейтинг', validators=[MinValueValidator(0), MaxValueValidator(100)])
-    image = models.ImageField(upload_to='images/', verbose_name='обложка', )
-    inner_image = models.ImageField(upload_to='inner_images/', verbose_name='внутренная обложка',)
+    year = models.PositiveSmallIntegerField(verbose_name='год выпуска')
+    rating = models.PositiveSmallIntegerField(verbose_name='рейтинг', validators=[MinValueValidator(0), MaxValueValidator(100)])
+    image = models.ImageField(upload_to='images/', storage=get_poster_storage, verbose_name='обложка', )
+    inner_image = models.ImageField(upload_to='inner_images/', storage=get_poster_storage, verbose_name='внутренная обложка',)
+    # {'name': image name, 'widths': [...]} of the resized variants, see apps/thumbnails.py
+    image_derivatives = models.JSONField('размеры обложки', default=dict, editable=False)
+    inner_image_derivatives = models.JSONField('размеры внутренней обложки', default=dict, editable=False)
     overview = models.CharField(max_length=1000, verbose_name='Краткое описание',)
     genres = models.ManyToManyField(Genre, verbose_name='Жанры', related_name='movies', )
     director = models.ForeignKey(Director, verbose_name = 'Режиссёр', on_delete=models.CASCADE, related_name='movies',)
     views = models.PositiveIntegerField('просмотры', default=0)
+    comment_count = models.PositiveIntegerField('комментарии', default=0, editable=False)
     author = models.ForeignKey('auth.User', on_delete=models.CASCADE, verbose_name='автор', null=True)
+    updated_at = models.DateTimeField(verbose_name='дата изменения', auto_now=True, db_index=True)
     # content = models.TextField(verbose_name='контент', null=True) 
     # actors = models.ManyToManyField(Actor, verbose_name='Актеры', related_name='movies')
 
@@ -64,10 +97,14 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Коментарий'
         verbose_name_plural = 'Коментарий'
+        indexes = [
+            # comments of a movie in date order, also serves the movie foreign key
+            models.Index(fields=['movie', 'date', 'id'], name='comment_movie_date_id_idx'),
+        ]
     
     name = models.CharField(max_length=100, verbose_name='Имя и фамилия')
     text = models.TextField(verbose_name='текст')
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE,
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False,
                             verbose_name='Фильм', related_name='comments')
     date = models.DateField(verbose_name='дата добавление', auto_now_add=True)
 
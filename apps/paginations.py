@@ -0,0 +1,183 @@
+"""
+Keyset (cursor) pagination.
+
+Unlike ``django.core.paginator.Paginator`` there is no ``COUNT(*)`` and no
+``OFFSET``: each page is fetched with a ``WHERE (key, id) < (last key, last
+id)`` predicate, so page 1000 costs the same as page 1.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+MAX_PAGE_SIZE = 100
+
+MOVIE_ORDERINGS = {
+    'new': ('-id',),
+    'rating': ('-rating', '-id'),
+    'views': ('-views', '-id'),
+}
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def page_size(value, default, maximum=MAX_PAGE_SIZE):
+    """A ``limit``/``page_size`` parameter clamped to 1..``maximum``, ``default`` when it is not an integer."""
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _value(row, name):
+    if isinstance(row, dict):
+        return row[name]
+    field = row._meta.get_field(name)
+    return field.get_prep_value(field.value_from_object(row))
+
+
+class KeysetPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    ``ordering`` is a tuple of field names like ``('-rating', '-id')``; the
+    last one must be unique so that every row has a distinct position.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-id',), name='new'):
+        self.object_list = object_list
+        self.per_page = max(int(per_page), 1)
+        self.ordering = tuple(ordering)
+        self.name = name
+
+    @property
+    def fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def _after(self, values, reverse):
+        """Rows strictly after ``values`` in ordering (or before when reversed)."""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _cursor(self, row, previous):
+        return encode_cursor({
+            'o': self.name,
+            'v': [_value(row, field) for field, _ in self.fields],
+            'p': previous,
+        })
+
+    def _position(self, values):
+        """Cursor values as the ordering fields' Python values, a tampered cursor is invalid."""
+        model = self.object_list.model
+        try:
+            position = [model._meta.get_field(field).to_python(value)
+                        for (field, _), value in zip(self.fields, values)]
+        except (ValidationError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+        if None in position:
+            raise InvalidCursor('Invalid cursor')
+        return position
+
+    def _query(self, cursor):
+        """The rows query of the page at ``cursor``, with its position and direction."""
+        position = None
+        previous = False
+        if cursor:
+            data = decode_cursor(cursor)
+            if not isinstance(data, dict) or data.get('o') != self.name or \
+                    not isinstance(data.get('v'), list) or len(data['v']) != len(self.ordering):
+                raise InvalidCursor('Invalid cursor')
+            position = self._position(data['v'])
+            previous = bool(data.get('p'))
+
+        queryset = self.object_list
+        if previous:
+            queryset = queryset.order_by(*(field[1:] if field.startswith('-') else f'-{field}'
+                                           for field in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, previous))
+        return queryset[:self.per_page + 1], position, previous
+
+    def _page(self, rows, position, previous):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if previous:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, self, None, None)
+        if previous:
+            next_cursor = self._cursor(rows[-1], False)
+            previous_cursor = self._cursor(rows[0], True) if has_more else None
+        else:
+            next_cursor = self._cursor(rows[-1], False) if has_more else None
+            previous_cursor = self._cursor(rows[0], True) if position is not None else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        queryset, position, previous = self._query(cursor)
+        return self._page(list(queryset), position, previous)
+
+    async def apage(self, cursor=None):
+        """``page()`` read through the async ORM."""
+        queryset, position, previous = self._query(cursor)
+        return self._page([row async for row in queryset], position, previous)
+
+    def get_page(self, cursor=None):
+        """Like ``Paginator.get_page``: fall back to the first page on a bad cursor."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,140 @@
+"""
+Read replicas.
+
+``ReplicaRouter`` sends the reads of ``DATABASE_ROUTING['APPS']`` models made
+while serving a request to one of ``DATABASE_ROUTING['REPLICAS']``, picked per
+request, and everything else to ``default``: writes, reads of other apps
+(sessions, users), and all queries outside a request (commands, background
+flushes). A request is pinned to ``default`` when its method is unsafe, as
+soon as it writes a routed model, and for ``STICKY_SECONDS`` after a write of
+the same client (a cookie), so a user reads their own writes while the
+replicas lag. Reads inside ``primary()`` go to ``default`` too: the API
+response cache fills entries through it, so a lagging replica never stores
+an old payload under the version a write has just bumped. ``manage.py replicate_db`` refreshes SQLite replica files.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+DEFAULTS = {
+    'REPLICAS': [],
+    'APPS': ('apps',),  # labels of the apps whose reads may go to a replica
+    'STICKY_SECONDS': 10,  # reads stay on the primary this long after a write
+    'COOKIE_NAME': 'db_primary',
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('db_routing', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {})}
+
+
+class RoutingState:
+
+    def __init__(self, replica, pinned):
+        self.replica = replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+@contextmanager
+def primary():
+    """Send the reads of the block to the primary, for results that outlive the request like cached responses."""
+    state = _current.get()
+    if state is None or state.pinned:
+        yield
+        return
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = state.wrote
+
+
+@contextmanager
+def detached():
+    """Route the block like work outside a request, for writes that are not the client's own."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.pinned or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in get_config()['APPS']:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None and model._meta.app_label in get_config()['APPS']:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_config()['REPLICAS']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in get_config()['REPLICAS']:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        config = get_config()
+        replica = random.choice(config['REPLICAS']) if config['REPLICAS'] else None
+        pinned = request.method not in SAFE_METHODS or config['COOKIE_NAME'] in request.COOKIES
+        return RoutingState(replica, pinned)
+
+    def finish(self, response, state):
+        if state.wrote and state.replica is not None:
+            config = get_config()
+            response.set_cookie(config['COOKIE_NAME'], '1', max_age=config['STICKY_SECONDS'],
+                                httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(response, state)
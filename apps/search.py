@@ -0,0 +1,156 @@
+"""
+Movie search.
+
+On SQLite the catalog is indexed in the ``apps_movie_search`` FTS5 table
+(created by migration 0002, kept up to date by ``apps.signals`` and rebuilt
+with ``manage.py rebuild_search_index``) and results are ranked with bm25.
+Other backends, or SQLite builds without FTS5, fall back to ``LIKE``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+
+from apps.models import Movie
+
+
+TABLE = 'apps_movie_search'
+
+# bm25 weights for the name, overview, director and genres columns
+WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+
+_fts_available = {}
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+            _fts_available[connection.alias] = cursor.fetchone() is not None
+    return _fts_available[connection.alias]
+
+
+def create_index(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "name, overview, director, genres, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def to_match_query(search):
+    """Turn user input into an FTS5 query where every word is a prefix term."""
+    words = re.findall(r'\w+', search)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _document(movie):
+    return (
+        movie.id,
+        movie.name,
+        movie.overview,
+        movie.director.full_name if movie.director_id else '',
+        ' '.join(genre.name for genre in movie.genres.all()),
+    )
+
+
+def index_movies(movie_ids):
+    if not fts_available() or not movie_ids:
+        return
+    movie_ids = list(movie_ids)
+    movies = Movie.objects.filter(id__in=movie_ids).select_related('director').prefetch_related('genres')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(movie_ids))})', movie_ids)
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, overview, director, genres) VALUES (%s, %s, %s, %s, %s)',
+            [_document(movie) for movie in movies])
+
+
+def unindex_movie(movie_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [movie_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Drop and refill the index, returns the number of indexed movies."""
+    if connection.vendor != 'sqlite':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        create_index(cursor)
+    _fts_available[connection.alias] = True
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(Movie.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        index_movies(ids)
+        total += len(ids)
+        last_id = ids[-1]
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+class FTSResults:
+    """
+    Lazily evaluated, ranked result list that ``Paginator`` can slice, so
+    only one page of movies is ever loaded.
+    """
+
+    def __init__(self, match):
+        self.match = match
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s', [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.match:
+            return []
+        start = key.start or 0
+        limit = -1 if key.stop is None else key.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY bm25({TABLE}, {", ".join(map(str, WEIGHTS))}) LIMIT %s OFFSET %s',
+                [self.match, limit, start])
+            ids = [row[0] for row in cursor.fetchall()]
+        movies = Movie.objects.in_bulk(ids)
+        return [movies[id] for id in ids if id in movies]
+
+
+def like_search(search):
+    words = re.findall(r'\w+', search)
+    condition = Q()
+    for word in words:
+        condition &= (
+            Q(name__icontains=word) |
+            Q(overview__icontains=word) |
+            Q(director__full_name__icontains=word) |
+            Q(genres__name__icontains=word)
+        )
+    matches = Movie.objects.filter(id__in=Movie.objects.filter(condition).values('id'))
+    return matches.annotate(
+        name_match=Case(When(name__icontains=search, then=Value(1)), default=Value(0), output_field=IntegerField())
+    ).order_by('-name_match', '-id')
+
+
+def search_movies(search):
+    """Return a sliceable sequence of movies matching ``search``, best first."""
+    if fts_available():
+        return FTSResults(to_match_query(search))
+    return like_search(search)
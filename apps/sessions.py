@@ -0,0 +1,33 @@
+"""
+Session engine (``SESSION_ENGINE = 'apps.sessions'``).
+
+Django's ``cached_db`` engine, which reads sessions from the cache and falls
+back to the database, except that sessions without a logged in user are only
+kept in the cache. Anonymous visitors never touch the session table; the row
+of a session is written once a user logs in (``login()`` saves it under a new
+key) and on the later changes of that session. An anonymous session evicted
+from the cache starts over empty.
+
+With more than one worker process ``SESSION_CACHE_ALIAS`` must name a cache
+the workers share, otherwise each worker only sees its own anonymous sessions.
+"""
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    cache_only = False  # saved by this store to the cache alone
+
+    def save(self, must_create=False):
+        if SESSION_KEY in self._get_session(no_load=must_create):
+            # login() sets the user after moving the session to a new key, which has no row yet
+            must_create, self.cache_only = must_create or self.cache_only, False
+            return super().save(must_create)
+        if self.session_key is None:
+            return self.create()
+        store = self._cache.add if must_create else self._cache.set
+        stored = store(self.cache_key, self._get_session(no_load=must_create), self.get_expiry_age())
+        if must_create and not stored:
+            raise CreateError
+        self.cache_only = True
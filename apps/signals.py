@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django_cleanup.signals import cleanup_post_delete
+from rest_framework.authtoken.models import Token
+
+from api import authentication
+from apps.models import Comment, Movie, Genre, Director
+from apps import counts, middleware, search, thumbnails
+from apps.storage import poster_storage
+from apps.versions import bump_version
+
+
+@receiver(post_save, sender=Movie)
+def index_saved_movie(sender, instance, **kwargs):
+    search.index_movies([instance.id])
+
+
+@receiver(pre_save, sender=Movie)
+def forget_replaced_derivatives(sender, instance, **kwargs):
+    # an upload still has its client name here, so it never matches the record
+    if not thumbnails.is_recorded(instance.image, instance.image_derivatives):
+        instance.image_derivatives = {}
+    if not thumbnails.is_recorded(instance.inner_image, instance.inner_image_derivatives):
+        instance.inner_image_derivatives = {}
+
+
+@receiver(post_save, sender=Movie)
+def schedule_poster_derivatives(sender, instance, **kwargs):
+    thumbnails.schedule(instance)
+
+
+@receiver(cleanup_post_delete, sender=Movie)
+def delete_poster_derivatives(sender, field_name, file_name, success, **kwargs):
+    # a content-addressed blob shared with another movie is kept, and so are its derivatives
+    if success and field_name in ('image', 'inner_image') and not poster_storage.exists(file_name):
+        thumbnails.delete(file_name)
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_deleted_movie(sender, instance, **kwargs):
+    search.unindex_movie(instance.id)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_movie_ids = list(instance.movies.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        movie_ids = [instance.id]
+    elif pk_set:
+        movie_ids = list(pk_set)
+    else:
+        movie_ids = instance._cleared_movie_ids
+    # the genres are part of the movie representation, see api.conditional
+    Movie.objects.filter(id__in=movie_ids).update(updated_at=timezone.now())
+    search.index_movies(movie_ids)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Director)
+def index_related_movies(sender, instance, created, **kwargs):
+    if not created:
+        search.index_movies(instance.movies.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Genre)
+def remember_genre_movies(sender, instance, **kwargs):
+    instance._search_movie_ids = list(instance.movies.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    movie_ids = getattr(instance, '_search_movie_ids', [])
+    Movie.objects.filter(id__in=movie_ids).update(updated_at=timezone.now())
+    search.index_movies(movie_ids)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Director)
+@receiver(post_delete, sender=Director)
+def bump_model_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def bump_movie_genres_version(sender, action, **kwargs):
+    # only the movie_count of the genres changes, which is left out of their version
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Movie)
+
+
+# counted parent of a movie and a comment
+PARENTS = {Movie: (Director, 'movie_count', 'director_id'), Comment: (Movie, 'comment_count', 'movie_id')}
+
+
+@receiver(pre_save, sender=Movie)
+@receiver(pre_save, sender=Comment)
+def remember_counted_parent(sender, instance, **kwargs):
+    if not instance._state.adding:
+        column = PARENTS[sender][2]
+        instance._counted_parent_id = sender.objects.filter(pk=instance.pk).values_list(column, flat=True).first()
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Comment)
+def count_saved(sender, instance, created, **kwargs):
+    parent, field, column = PARENTS[sender]
+    current = getattr(instance, column)
+    previous = None if created else getattr(instance, '_counted_parent_id', current)
+    if previous != current:
+        counts.change(parent, field, [current], 1)
+        counts.change(parent, field, [previous], -1)
+
+
+@receiver(pre_delete, sender=Movie)
+def remember_counted_genres(sender, instance, **kwargs):
+    instance._counted_genre_ids = list(instance.genres.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Comment)
+def count_deleted(sender, instance, origin=None, **kwargs):
+    parent, field, column = PARENTS[sender]
+    # a cascade from the parent deletes the counter along with it
+    if getattr(origin, 'model', type(origin)) is not parent:
+        counts.change(parent, field, [getattr(instance, column)], -1)
+    if sender is Movie:
+        counts.change(Genre, 'movie_count', getattr(instance, '_counted_genre_ids', ()), -1)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def count_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_genre_ids = list(instance.genres.values_list('id', flat=True))
+    elif action == 'post_add' and pk_set:
+        # pk_set only holds the newly linked ids here
+        genre_ids, delta = ([instance.id], len(pk_set)) if reverse else (pk_set, 1)
+        counts.change(Genre, 'movie_count', genre_ids, delta)
+    elif action in ('post_remove', 'post_clear'):
+        # but a remove lists every requested id, linked or not, so recount
+        if reverse:
+            genre_ids = [instance.id]
+        else:
+            genre_ids = pk_set if action == 'post_remove' else instance._cleared_genre_ids
+        counts.recount(Genre, 'movie_count', genre_ids)
+
+
+@receiver(connection_created)
+def hook_queries(sender, connection, **kwargs):
+    middleware.install(connection)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_credentials(sender, user, **kwargs):
+    if user is not None:
+        authentication.invalidate_user(user.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_saved_user_credentials(sender, instance, created, update_fields=None, **kwargs):
+    # cached entries hold the user object, an admin may have deactivated or demoted it;
+    # a login only touching last_login changes nothing they hold that matters
+    if not created and update_fields != frozenset({'last_login'}):
+        authentication.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_rotated_token(sender, instance, **kwargs):
+    authentication.tokens.discard(instance.key)
+    authentication.invalidate_user(instance.user_id)
@@ -0,0 +1,152 @@
+"""
+Opt-in recorder of slow SQL queries.
+
+With ``SLOW_QUERIES['ENABLED']``, ``SlowQueryMiddleware`` times every query of
+a request through ``execute_wrapper``. Queries over ``THRESHOLD_MS`` are logged
+on the ``apps.slow_queries`` logger and kept in a bounded buffer keyed by SQL
+fingerprint (literals and ``IN`` lists normalized). Each entry holds the count,
+total and worst time, the parameters and origin (view and template line) of the
+worst run, and an ``EXPLAIN QUERY PLAN`` captured the first time the
+fingerprint is seen. The least recently seen fingerprint is evicted when the
+buffer is full. ``/admin/slow-queries/`` lists the top offenders.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template.base import Node
+
+from apps.middleware import QueryHookMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'BUFFER_SIZE': 200,  # distinct fingerprints kept
+    'EXPLAIN': True,
+}
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_local = threading.local()
+_root = str(settings.BASE_DIR)
+# other execute wrappers on the stack are not where a query comes from
+WRAPPER_MODULES = ('apps.middleware', 'apps.metrics', 'apps.timing', __name__)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SLOW_QUERIES', {})}
+
+
+def fingerprint(sql):
+    """``sql`` with literals, placeholders and ``IN`` lists replaced by ``?``."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def origin(depth=3):
+    """
+    Project code lines (innermost first, down to the view) and the template
+    line that issued the current query.
+    """
+    code = []
+    template = None
+    wrappers = {os.path.abspath(sys.modules[name].__file__) for name in WRAPPER_MODULES if name in sys.modules}
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if len(code) < depth and filename.startswith(_root) and filename not in wrappers \
+                and 'site-packages' not in filename:
+            code.append(f'{os.path.relpath(filename, _root)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        # type() rather than isinstance(), which would evaluate lazy objects such as request.user
+        node = frame.f_locals.get('self')
+        if template is None and issubclass(type(node), Node) and getattr(node, 'origin', None) and node.token:
+            template = f'{node.origin.template_name}:{node.token.lineno}'
+        frame = frame.f_back
+    return {'code': ' < '.join(code) or None, 'template': template}
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {e}'
+    finally:
+        _local.explaining = False
+
+
+def record(connection, sql, params, duration, many=False):
+    config = get_config()
+    key = fingerprint(sql)
+    where = origin()
+    with _lock:
+        entry = _entries.get(key)
+        is_new = entry is None
+        if is_new:
+            entry = _entries[key] = {
+                'fingerprint': key, 'count': 0, 'total_ms': 0, 'max_ms': 0, 'plan': None}
+        entry['count'] += 1
+        entry['total_ms'] += duration
+        entry['last_seen'] = time.time()
+        if duration >= entry['max_ms']:
+            entry.update(max_ms=duration, sql=sql, params=repr(params), **where)
+        _entries.move_to_end(key)
+        while len(_entries) > config['BUFFER_SIZE']:
+            _entries.popitem(last=False)
+    if is_new and config['EXPLAIN'] and not many:
+        entry['plan'] = explain(connection, sql, params)
+    logger.warning('Slow query (%.1f ms) at %s%s: %s; params=%r', duration, where['code'],
+                   f' ({where["template"]})' if where['template'] else '', sql, params)
+
+
+class SlowQueryRecorder:
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+
+    def execute(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= self.threshold_ms:
+                record(context['connection'], sql, params, duration, many)
+
+
+class SlowQueryMiddleware(QueryHookMiddleware):
+
+    def start(self, request):
+        config = get_config()
+        if not config['ENABLED']:
+            return None
+        return SlowQueryRecorder(config['THRESHOLD_MS'])
+
+
+def top(order_by='total_ms', limit=50):
+    with _lock:
+        entries = [dict(entry) for entry in _entries.values()]
+    return sorted(entries, key=lambda entry: entry[order_by], reverse=True)[:limit]
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,137 @@
+"""
+Content-addressed storage for movie posters.
+
+Uploads are streamed through SHA-256 into a temporary file and moved to
+``posters/<ab>/<cd>/<digest><ext>``; a second upload of the same bytes reuses
+the existing blob. Every blob has an ``apps.PosterBlob`` row counting the
+fields that point at it: ``save()`` takes a reference for the field the name
+is assigned to, ``retain()`` takes more for names assigned without an upload
+(batch writes), and ``delete()`` (``django_cleanup`` calls it on change and
+delete) drops one, removing the file with the last. The row is locked while
+the file is written or removed, so an upload of the same bytes never races a
+delete. ``recount()`` recomputes the counts from the rows, see
+``manage.py dedupe_media``.
+"""
+import hashlib
+import os
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, F
+from django.utils.deconstruct import deconstructible
+
+
+def blob_model():
+    # apps.models imports this module for the storage of its file fields
+    return apps.get_model('apps', 'PosterBlob')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    prefix = 'posters'
+    chunk_size = 64 * 1024
+
+    def blob_name(self, digest, ext):
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+    def is_blob(self, name):
+        return name.startswith(f'{self.prefix}/')
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        _, ext = os.path.splitext(name)
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    temp.write(chunk)
+            blob = self.blob_name(digest.hexdigest(), ext)
+            path = self.path(blob)
+            with transaction.atomic(using=router.db_for_write(blob_model())):
+                self._lock(blob).update(references=F('references') + 1)
+                if os.path.exists(path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temp_path, self.file_permissions_mode)
+                    os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return blob
+
+    def _lock(self, name):
+        """The blob's row, created if missing and locked until the transaction ends."""
+        PosterBlob = blob_model()
+        PosterBlob.objects.select_for_update().get_or_create(name=name)
+        return PosterBlob.objects.filter(name=name)
+
+    def retain(self, *names):
+        """Take a reference per name for rows assigned a stored blob name without an upload."""
+        counts = Counter(name for name in names if self.is_blob(name))
+        with transaction.atomic(using=router.db_for_write(blob_model())):
+            for name, count in counts.items():
+                self._lock(name).update(references=F('references') + count)
+                if not self.exists(name):
+                    raise IntegrityError(f'{name} is not in storage')
+
+    def delete(self, name):
+        if not self.is_blob(name):
+            return super().delete(name)
+        with transaction.atomic(using=router.db_for_write(blob_model())):
+            blob = self._lock(name)
+            if blob.filter(references__gt=1).update(references=F('references') - 1):
+                return
+            blob.delete()
+            super().delete(name)
+
+    def purge(self, name):
+        """Delete the blob if nothing references it, returns whether it was deleted."""
+        with transaction.atomic(using=router.db_for_write(blob_model())):
+            if not self._lock(name).filter(references=0).delete()[0]:
+                return False
+            super().delete(name)
+            return True
+
+    def fields(self):
+        """(model, field name) of every file field using this storage."""
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                    yield model, field.name
+
+    def recount(self):
+        """Reset the reference counts from the rows, returns the names of unreferenced blobs."""
+        PosterBlob = blob_model()
+        counts = Counter()
+        for model, field in self.fields():
+            rows = (model._default_manager.filter(**{f'{field}__startswith': f'{self.prefix}/'})
+                    .values_list(field).annotate(references=Count('pk')).order_by())
+            for name, references in rows:
+                counts[name] += references
+        with transaction.atomic(using=router.db_for_write(PosterBlob)):
+            PosterBlob.objects.update(references=0)
+            PosterBlob.objects.bulk_create(
+                [PosterBlob(name=name, references=references) for name, references in counts.items()],
+                update_conflicts=True, unique_fields=['name'], update_fields=['references'], batch_size=1000)
+            return list(PosterBlob.objects.filter(references=0).values_list('name', flat=True))
+
+
+poster_storage = ContentAddressedStorage()
+
+
+def get_poster_storage():
+    return poster_storage
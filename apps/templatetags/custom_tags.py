@@ -1,10 +1,26 @@
 from django import template
 
-from apps.models import Genre
+from apps import thumbnails
+from apps.catalog import genre_catalog
 
 register = template.Library()
 
 
 @register.simple_tag
 def get_all_genres():
-    return Genre.objects.all()
\ No newline at end of file
+    return genre_catalog.all()
+
+@register.simple_tag(takes_context=True)
+def query_with(context, **params):
+    """Current query string with ``params`` replaced, page offsets dropped."""
+    query = context['request'].GET.copy()
+    query.pop('offset', None)
+    for key, value in params.items():
+        query[key] = value
+    return f'?{query.urlencode()}'
+
+
+@register.simple_tag
+def poster_srcset(derivatives, fmt='jpeg'):
+    """``srcset`` of the resized derivatives recorded on a movie, e.g. ``movie.image_derivatives``."""
+    return thumbnails.srcset(derivatives, fmt)
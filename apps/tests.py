@@ -0,0 +1,819 @@
+import importlib
+import json
+import os
+import sqlite3
+import tempfile
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, router
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image as PILImage
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from api.serializers import MovieSerializer
+from apps import counts, metrics, search, sessions, slow_queries, thumbnails
+from apps.catalog import genre_catalog
+from apps.counters import ViewCounter
+from apps.filters import MovieFilter
+from apps.management.commands import replicate_db, run_benchmarks
+from apps.models import Comment, Director, Genre, Movie, PosterBlob
+from apps.paginations import KeysetPaginator, MOVIE_ORDERINGS, encode_cursor
+from apps.routers import ReplicaMiddleware
+from apps.storage import poster_storage
+from apps.versions import get_version
+
+
+def create_catalog(movies=5, genres=3):
+    director = Director.objects.create(full_name='Director')
+    genres = [Genre.objects.create(name=f'Genre {i}') for i in range(genres)]
+    for i in range(movies):
+        movie = Movie.objects.create(
+            name=f'Movie {i}', year=2000, rating=7, image='images/poster.jpg',
+            inner_image='inner_images/poster.jpg', overview='Overview', director=director)
+        movie.genres.set(genres)
+    return Movie.objects.first()
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot list and comment queries must be answered from an index, without
+    a full scan or a temporary sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog()
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_plans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked on SQLite')
+        by_rating = MOVIE_ORDERINGS['rating']
+        after = KeysetPaginator(Movie.objects.all(), 20, by_rating, 'rating')._after([7, 1], False)
+        plans = [
+            ('movie_rating_id_idx', Movie.objects.order_by(*by_rating)[:20]),
+            ('movie_rating_id_idx', Movie.objects.filter(after).order_by(*by_rating)[:20]),
+            ('movie_views_id_idx', Movie.objects.order_by(*MOVIE_ORDERINGS['views'])[:20]),
+            ('movie_name_idx', Movie.objects.filter(name='Movie 1')),
+            ('comment_movie_date_id_idx', Comment.objects.filter(movie=self.movie).order_by('date', 'id')[:3]),
+            ('movie_year_idx', MovieFilter({'year_min': 1990, 'year_max': 1999}, queryset=Movie.objects.all()).qs),
+        ]
+        for index, queryset in plans:
+            with self.subTest(query=str(queryset.query)):
+                self.assertUsesIndex(queryset, index)
+
+
+class MovieFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(movies=4)
+        for rating, movie in enumerate(Movie.objects.order_by('id'), start=1):
+            Movie.objects.filter(id=movie.id).update(year=1990 + rating, rating=rating * 20)
+
+    def ratings(self, data):
+        return sorted(MovieFilter(data, queryset=Movie.objects.all()).qs.values_list('rating', flat=True))
+
+    def test_ranges(self):
+        self.assertEqual(self.ratings({'rating_min': 30, 'rating_max': 80}), [40, 60, 80])
+        self.assertEqual(self.ratings({'year_min': 1993}), [60, 80])
+        self.assertEqual(self.ratings({'year_max': 1992, 'rating_min': 30}), [40])
+
+    def test_main_page(self):
+        response = self.client.get('/', {'rating_min': 70, 'sort': 'rating', 'limit': 10})
+        self.assertEqual([movie.rating for movie in response.context['movies_list']], [80])
+
+
+class GenreCatalogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1, genres=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self):
+        return [name for _, name in genre_catalog.choices()]
+
+    def test_reloads_after_genre_writes(self):
+        self.assertEqual(self.names(), ['Genre 0', 'Genre 1'])
+        with self.assertNumQueries(0):
+            self.names()
+        # the movie counts of genres are left out of their version
+        self.movie.genres.remove(Genre.objects.first())
+        with self.assertNumQueries(0):
+            self.names()
+
+        genre = Genre.objects.create(name='Western')
+        self.assertEqual(self.names(), ['Genre 0', 'Genre 1', 'Western'])
+        genre.name = 'Noir'
+        genre.save()
+        self.assertEqual(self.names(), ['Genre 0', 'Genre 1', 'Noir'])
+        genre.delete()
+        self.assertEqual(self.names(), ['Genre 0', 'Genre 1'])
+
+    def test_filter_accepts_new_genre(self):
+        MovieFilter({}, queryset=Movie.objects.all()).qs
+        genre = Genre.objects.create(name='Western')
+        self.movie.genres.add(genre)
+        movie_filter = MovieFilter({'genres': [genre.id]}, queryset=Movie.objects.all())
+        self.assertTrue(movie_filter.is_valid(), movie_filter.errors)
+        self.assertEqual(list(movie_filter.qs), [self.movie])
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(movies=7)
+        # ties in every sort key but the id
+        for i, movie in enumerate(Movie.objects.order_by('id')):
+            Movie.objects.filter(id=movie.id).update(rating=[5, 7, 5, 7, 7, 9, 5][i], views=i // 3)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, ordering, name):
+        paginator = KeysetPaginator(Movie.objects.all(), 2, ordering, name)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.page(backwards[-1].previous_cursor))
+        return [[movie.id for movie in page] for page in pages], [[movie.id for movie in page] for page in backwards]
+
+    def test_round_trip(self):
+        for name, ordering in MOVIE_ORDERINGS.items():
+            with self.subTest(sort=name):
+                forward, backward = self.walk(ordering, name)
+                expected = list(Movie.objects.order_by(*ordering).values_list('id', flat=True))
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward[::-1])
+                self.assertFalse(KeysetPaginator(Movie.objects.all(), 2, ordering, name).page().has_previous())
+
+    def test_invalid_cursor(self):
+        cursors = [
+            'not a cursor',
+            encode_cursor(['rating']),
+            encode_cursor({'o': 'new', 'v': [7, 1]}),
+            encode_cursor({'o': 'rating', 'v': ['seven', 1]}),
+            encode_cursor({'o': 'rating', 'v': [None, 1]}),
+            encode_cursor({'o': 'rating', 'v': '71'}),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/movies/', {'sort': 'rating', 'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'cursor': ['Invalid cursor']})
+        # the site falls back to the first page
+        response = self.client.get('/', {'sort': 'rating', 'cursor': cursors[3]})
+        self.assertFalse(response.context['movies_list'].has_previous())
+
+    def test_offset_or_keyset(self):
+        paged = self.client.get('/api/movies/', {'page': 1}).json()
+        self.assertEqual(paged['count'], 7)
+        keyset = self.client.get('/api/movies/', {'cursor': '', 'page_size': 3}).json()
+        self.assertNotIn('count', keyset)
+        self.assertEqual(len(keyset['results']), 3)
+        self.assertIn('cursor=', keyset['next'])
+        self.assertTrue(self.client.get('/', {'limit': 3}).context['movies_list'].is_cursor)
+        page = self.client.get('/', {'limit': 3, 'offset': 2}).context['movies_list']
+        self.assertEqual((page.number, page.paginator.count), (2, 7))
+
+    def test_page_size_bounds(self):
+        for size, expected in (('-5', 1), ('-1', 1), ('0', 1), ('abc', 7), ('1000', 7)):
+            with self.subTest(size=size):
+                response = self.client.get('/api/movies/', {'cursor': '', 'page_size': size})
+                self.assertEqual(len(response.json()['results']), expected)
+        self.client.force_login(User.objects.create_user('editor'))
+        for limit, expected in (('-5', 1), ('abc', 2)):
+            for params in ({'limit': limit}, {'limit': limit, 'offset': 'x'}):
+                with self.subTest(**params):
+                    for url in ('/', '/workspace/movies/'):
+                        self.assertEqual(len(self.client.get(url, params).context['movies_list']), expected)
+                    data = views.list_movies(APIRequestFactory().get('/', params)).data
+                    self.assertEqual((len(data['data']), data['limit'], data['offset']), (expected, expected, 1))
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.director = Director.objects.create(full_name='Stanley Kubrick')
+        cls.genre = Genre.objects.create(name='Drama')
+        images = {'image': 'images/poster.jpg', 'inner_image': 'inner_images/poster.jpg'}
+        cls.overview = Movie.objects.create(
+            name='Paths of Glory', year=1957, rating=8, overview='A kubrick classic', director=cls.director, **images)
+        cls.title = Movie.objects.create(
+            name='Kubrick Remembered', year=2014, rating=7, overview='Documentary', director=cls.director, **images)
+        cls.other = Movie.objects.create(
+            name='Heat', year=1995, rating=8, overview='Crime', director=Director.objects.create(full_name='Mann'),
+            **images)
+        cls.other.genres.add(cls.genre)
+
+    def setUp(self):
+        if not search.fts_available():
+            self.skipTest('SQLite without FTS5')
+
+    def names(self, query):
+        return [movie.name for movie in search.search_movies(query)[:10]]
+
+    def test_ranking(self):
+        # a match in the name outweighs one in the overview
+        self.assertEqual(self.names('kubrick'), ['Kubrick Remembered', 'Paths of Glory'])
+        self.assertEqual(self.names('kubr glory'), ['Paths of Glory'])
+        self.assertEqual(search.search_movies('kubrick').count(), 2)
+
+    def test_reindex_on_writes(self):
+        self.other.name = 'Heat Kubrick'
+        self.other.save()
+        self.assertIn('Heat Kubrick', self.names('kubrick'))
+        self.genre.name = 'Thriller'
+        self.genre.save()
+        self.assertEqual(self.names('thriller'), ['Heat Kubrick'])
+        self.director.full_name = 'Kubrick Stanley'
+        self.director.save()
+        self.assertEqual(self.names('stanley'), ['Kubrick Remembered', 'Paths of Glory'])
+        self.genre.delete()
+        self.assertEqual(self.names('thriller'), [])
+        self.title.delete()
+        self.assertEqual(self.names('remembered'), [])
+        self.director.delete()
+        self.assertEqual(self.names('stanley'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.names('kubrick'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('Indexed 3 movies', out.getvalue())
+        self.assertEqual(self.names('kubrick'), ['Kubrick Remembered', 'Paths of Glory'])
+
+    def test_like_fallback(self):
+        with mock.patch('apps.search.fts_available', return_value=False):
+            self.assertEqual(self.names('kubrick'), ['Kubrick Remembered', 'Paths of Glory'])
+            self.assertEqual(self.names('drama heat'), ['Heat'])
+            response = self.client.get('/', {'search': 'kubrick'})
+        self.assertEqual([movie.name for movie in response.context['movies_list']],
+                         ['Kubrick Remembered', 'Paths of Glory'])
+
+
+class WorkspaceMovieFormTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1)
+        cls.user = User.objects.create_user('editor')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.data = {'name': 'Edited', 'overview': 'Overview', 'year': '1999', 'rating': '80',
+                     'director': self.movie.director_id, 'genres': [Genre.objects.first().id]}
+
+    def test_update(self):
+        response = self.client.post(f'/workspace/movies/{self.movie.id}/update/', self.data)
+        self.assertEqual(response.status_code, 302)
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.name, self.movie.year, self.movie.rating), ('Edited', 1999, 80))
+        self.assertEqual(self.movie.genres.count(), 1)
+
+    def test_invalid_numbers(self):
+        for field, value in (('year', ''), ('rating', ''), ('rating', '101'), ('year', 'soon')):
+            with self.subTest(field=field, value=value):
+                data = {**self.data, field: value}
+                for url in (f'/workspace/movies/{self.movie.id}/update/', '/workspace/movies/add'):
+                    response = self.client.post(url, data)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(field, response.json()['errors'])
+        self.assertEqual(Movie.objects.count(), 1)
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.year, self.movie.rating), (2000, 7))
+
+    def test_migration_rejects_legacy_values(self):
+        migration = importlib.import_module('apps.migrations.0006_typed_year_rating')
+        self.assertEqual(migration.parse('7,6', 100), 8)
+        self.assertEqual(migration.parse('1999 год', 32767), 1999)
+        for value in ('', 'n/a', '120'):
+            self.assertIsNone(migration.parse(value, 100))
+        legacy = mock.Mock()
+        legacy.get_model.return_value.objects.only.return_value = [SimpleNamespace(id=1, year='1999', rating='n/a')]
+        with self.assertRaisesMessage(ValueError, "movie 1: rating 'n/a'"):
+            migration.copy_to_numbers(legacy, None)
+        legacy.get_model.return_value.objects.bulk_update.assert_not_called()
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=2, genres=3)
+        cls.genres = list(Genre.objects.order_by('id'))
+        cls.user = User.objects.create_user('editor')
+
+    def assertCounts(self, comments, genres, directors):
+        self.assertEqual(list(Movie.objects.order_by('id').values_list('comment_count', flat=True)), comments)
+        self.assertEqual(list(Genre.objects.order_by('id').values_list('movie_count', flat=True)), genres)
+        self.assertEqual(list(Director.objects.order_by('id').values_list('movie_count', flat=True)), directors)
+
+    def test_comments(self):
+        for text in ('First', 'Second'):
+            self.client.post('/ajax/create_comment/', {'movie': self.movie.id, 'name': 'Name', 'text': text})
+        self.assertCounts([2, 0], [2, 2, 2], [2])
+        self.client.force_login(self.user)
+        self.client.post(f'/workspace/ajax/comments/{Comment.objects.first().id}/delete/')
+        self.assertCounts([1, 0], [2, 2, 2], [2])
+
+    def test_genres_and_directors(self):
+        self.movie.genres.remove(self.genres[0], self.genres[0])
+        self.genres[1].movies.clear()
+        self.assertCounts([0, 0], [1, 0, 2], [2])
+        self.genres[0].movies.add(self.movie)
+        self.movie.genres.set(self.genres[1:])
+        self.assertCounts([0, 0], [1, 1, 2], [2])
+        self.movie.director = Director.objects.create(full_name='Other')
+        self.movie.save()
+        self.assertCounts([0, 0], [1, 1, 2], [1, 1])
+        self.movie.delete()
+        self.assertCounts([0], [1, 0, 1], [1, 0])
+
+    def test_counts_keep_validators(self):
+        cache.clear()
+        url = f'/api/movies/{self.movie.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.post('/ajax/create_comment/', {'movie': self.movie.id, 'name': 'Name', 'text': 'Text'})
+        self.assertCounts([1, 0], [2, 2, 2], [2])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        genre_version = get_version(Genre)
+        self.movie.genres.remove(self.genres[0])
+        self.assertEqual(get_version(Genre), genre_version)
+
+    def test_repair(self):
+        Comment.objects.create(movie=self.movie, name='Name', text='Text')
+        Movie.objects.update(comment_count=5)
+        Genre.objects.update(movie_count=0)
+        self.assertEqual(counts.recount_all(), {'Movie.comment_count': 2, 'Genre.movie_count': 3,
+                                                'Director.movie_count': 0})
+        self.assertCounts([1, 0], [2, 2, 2], [2])
+
+
+class ViewCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=2)
+
+    def setUp(self):
+        cache.clear()
+        self.counter = ViewCounter()
+
+    def test_buffers_until_flush(self):
+        with override_settings(VIEW_COUNTER={'FLUSH_INTERVAL': 3600}):
+            for _ in range(3):
+                self.counter.increment(self.movie.id)
+            self.counter._timer.cancel()
+            self.assertEqual(Movie.objects.get(id=self.movie.id).views, 0)
+            self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(Movie.objects.get(id=self.movie.id).views, 3)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_restores_views(self):
+        self.counter.buffer.add(self.movie.id, 2)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.counter.flush()
+        self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(Movie.objects.get(id=self.movie.id).views, 2)
+
+    @override_settings(VIEW_COUNTER={'CACHE_ALIAS': 'default'})
+    def test_workers_share_cache_buffer(self):
+        workers = [ViewCounter(), ViewCounter()]
+        other = Movie.objects.exclude(id=self.movie.id).get()
+        workers[0].buffer.add(self.movie.id)
+        workers[1].buffer.add(other.id, 2)
+        workers[1].buffer.add(self.movie.id)
+        self.assertEqual(workers[0].buffer.drain(), {self.movie.id: 2, other.id: 2})
+        self.assertEqual(workers[1].buffer.drain(), {})
+        # an id is logged again after its flush
+        workers[1].buffer.add(other.id)
+        self.assertEqual(workers[0].flush(), 1)
+
+    @override_settings(VIEW_COUNTER={'CACHE_ALIAS': 'default'})
+    def test_flush_views_command(self):
+        ViewCounter().buffer.add(self.movie.id, 4)
+        with mock.patch('apps.management.commands.flush_views.view_counter', ViewCounter()):
+            out = StringIO()
+            call_command('flush_views', stdout=out)
+        self.assertIn('Flushed 4 views', out.getvalue())
+        self.assertEqual(Movie.objects.get(id=self.movie.id).views, 4)
+
+    def test_flush_keeps_validators(self):
+        url = f'/api/movies/{self.movie.id}/'
+        etag = self.client.get(url)['ETag']
+        self.counter.buffer.add(self.movie.id, 3)
+        self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(Movie.objects.get(id=self.movie.id).views, 3)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+
+class CommentFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1)
+        Comment.objects.bulk_create([Comment(movie=cls.movie, name=f'Name {i}', text='Text') for i in range(7)])
+
+    def test_pages(self):
+        response = self.client.get(f'/movies/{self.movie.id}/')
+        self.assertEqual([comment['name'] for comment in response.context['comments']], ['Name 6', 'Name 5', 'Name 4'])
+        cursor = response.context['comments'].next_cursor
+        names = []
+        while cursor:
+            # one query per page, however deep
+            with self.assertNumQueries(1):
+                data = self.client.get(f'/ajax/movies/{self.movie.id}/comments/', {'cursor': cursor}).json()
+            names += [comment['name'] for comment in data['results']]
+            cursor = data['next']
+        self.assertEqual(names, ['Name 3', 'Name 2', 'Name 1', 'Name 0'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/ajax/movies/{self.movie.id}/comments/', {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+
+def poster(width, height):
+    buffer = BytesIO()
+    PILImage.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='poster.png')
+
+
+def use_temporary_media(test):
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    settings = override_settings(MEDIA_ROOT=media.name)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+class PosterStorageTests(TestCase):
+
+    def setUp(self):
+        use_temporary_media(self)
+        # derivatives are not what is tested
+        schedule = mock.patch('apps.thumbnails.schedule')
+        schedule.start()
+        self.addCleanup(schedule.stop)
+        self.movie = create_catalog(movies=2)
+        self.other = Movie.objects.exclude(id=self.movie.id).get()
+
+    def references(self, name):
+        blob = PosterBlob.objects.filter(name=name).first()
+        return blob and blob.references
+
+    def upload(self, movie, width=30):
+        movie.image = poster(width, 45)
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.save()
+        return movie.image.name
+
+    def test_dedupe_and_refcounted_delete(self):
+        name = self.upload(self.movie)
+        self.assertTrue(poster_storage.is_blob(name))
+        self.assertEqual(self.upload(self.other), name)
+        self.assertEqual(self.references(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.delete()
+        self.assertTrue(poster_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+        # a new poster releases the old one
+        self.upload(self.other, width=40)
+        self.assertFalse(poster_storage.exists(name))
+        self.assertIsNone(self.references(name))
+
+    def test_upload_racing_a_delete(self):
+        name = self.upload(self.movie)
+        # the same bytes uploaded again, the row pointing at them is not written yet
+        self.assertEqual(poster_storage.save('images/copy.png', poster(30, 45)), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.delete()
+        self.assertTrue(poster_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+    def test_dedupe_media(self):
+        for movie, legacy in ((self.movie, 'images/a.png'), (self.other, 'images/b.png')):
+            default_storage.save(legacy, poster(30, 45))
+            Movie.objects.filter(id=movie.id).update(image=legacy)
+        default_storage.save('images/orphan.png', poster(50, 75))
+        orphan_blob = poster_storage.save('images/unused.png', poster(60, 90))
+        PosterBlob.objects.filter(name=orphan_blob).update(references=0)
+
+        out = StringIO()
+        call_command('dedupe_media', '--delete-orphans', stdout=out)
+        self.assertIn('3 legacy files, 1 distinct blobs, 1 missing, 2 unreferenced files deleted', out.getvalue())
+        names = set(Movie.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(self.references(name), 2)
+        for removed in ('images/a.png', 'images/b.png', 'images/orphan.png', orphan_blob):
+            self.assertFalse(default_storage.exists(removed), removed)
+        self.assertTrue(poster_storage.exists(name))
+
+
+class PosterDerivativeTests(TestCase):
+
+    def setUp(self):
+        use_temporary_media(self)
+        self.movie = create_catalog(movies=1)
+        self.movie.image = poster_storage.save('images/poster.png', poster(500, 750))
+        self.movie.save()
+
+    def test_generate_records_widths_up_to_the_original(self):
+        name = self.movie.image.name
+        self.assertEqual(thumbnails.generate(name), 4)
+        self.assertTrue(default_storage.exists(thumbnails.derivative_name(name, 400, 'webp')))
+        self.assertFalse(default_storage.exists(thumbnails.derivative_name(name, 800, 'webp')))
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.image_derivatives, {'name': name, 'widths': [200, 400]})
+
+        # a new image drops the record of the old one
+        self.movie.image = poster_storage.save('images/other.png', poster(300, 450))
+        self.movie.save()
+        self.assertEqual(self.movie.image_derivatives, {})
+
+    def test_srcset_reads_no_storage(self):
+        name = self.movie.image.name
+        thumbnails.generate(name)
+        self.movie.refresh_from_db()
+        with mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage checked')):
+            data = MovieSerializer(instance=self.movie).data
+        self.assertEqual(data['image_srcset']['webp'], ', '.join(
+            f'/media/{thumbnails.derivative_name(name, width, "webp")} {width}w' for width in (200, 400)))
+        self.assertEqual(data['inner_image_srcset'], {'webp': '', 'jpeg': ''})
+
+    def test_delete_removes_derivatives(self):
+        name = self.movie.image.name
+        thumbnails.generate(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.delete()
+        self.assertFalse(poster_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnails.derivative_name(name, 200, 'jpeg')))
+
+
+class ImportCatalogTests(TestCase):
+
+    def row(self, i, **extra):
+        return {'name': f'Imported {i}', 'year': 2001, 'rating': 70, 'overview': 'Overview',
+                'image': 'images/poster.jpg', 'inner_image': 'inner_images/poster.jpg',
+                'director': f'Director {i % 2}', 'genres': 'Drama|Comedy', **extra}
+
+    def run_import(self, rows, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'movies.jsonl')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.writelines(json.dumps(row) + '\n' for row in rows)
+            call_command('import_catalog', path, stdout=StringIO(), **options)
+
+    def test_import(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import([self.row(i) for i in range(5)], batch_size=2)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "apps_movie" ')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Movie.objects.count(), 5)
+        self.assertEqual(dict(Director.objects.values_list('full_name', 'movie_count')),
+                         {'Director 0': 3, 'Director 1': 2})
+        self.assertEqual(dict(Genre.objects.values_list('name', 'movie_count')), {'Drama': 5, 'Comedy': 5})
+        if search.fts_available():
+            self.assertEqual(search.search_movies('imported').count(), 5)
+
+    def test_bad_row_rolls_back_its_batch(self):
+        rows = [self.row(i) for i in range(4)]
+        rows[3].update(director='Newcomer', genres='Western', image='posters/00/00/missing.jpg')
+        with self.assertRaisesMessage(CommandError, 'Rows 3-4'):
+            self.run_import(rows, batch_size=2)
+        self.assertEqual(sorted(Movie.objects.values_list('name', flat=True)), ['Imported 0', 'Imported 1'])
+        self.assertFalse(Director.objects.filter(full_name='Newcomer').exists())
+        self.assertFalse(Genre.objects.filter(name='Western').exists())
+        self.assertEqual(dict(Genre.objects.values_list('name', 'movie_count')), {'Drama': 2, 'Comedy': 2})
+        if search.fts_available():
+            self.assertEqual(search.search_movies('imported').count(), 2)
+
+
+class BenchmarkSmokeTests(TestCase):
+
+    def test_seed_and_benchmark(self):
+        use_temporary_media(self)
+        call_command('seed_catalog', movies=20, genres=3, comments_per_movie=1, stdout=StringIO())
+        self.assertEqual(Movie.objects.count(), 20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command('run_benchmarks', transport='client', requests=3, warmup=1, output=path,
+                         stdout=StringIO(), stderr=StringIO())
+            with open(path) as file:
+                report = json.load(file)
+        self.assertEqual(report['meta']['catalog']['movie'], 20)
+        results = report['results']['client']
+        self.assertEqual(set(results), set(run_benchmarks.ENDPOINTS))
+        for name, result in results.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(result['statuses'], [200])
+                self.assertEqual(result['requests'], 3)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+                self.assertIsInstance(result['max_queries'], int)
+        self.assertGreater(results['detail']['max_queries'], 0)
+
+
+class DetailPageQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1)
+        Comment.objects.create(movie=cls.movie, name='Name', text='Text')
+
+    def test_detail(self):
+        # view counter lookup, movie + director, genres, sidebar genres, comments;
+        # the comments are not counted, see apps.counts
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/movies/{self.movie.id}/')
+        self.assertContains(response, 'Genre 2')
+
+
+@override_settings(DATABASE_ROUTING={'REPLICAS': ['replica']})
+class ReplicaRoutingTests(TestCase):
+
+    def route(self, request):
+        """Where a request reads movies, reads users, and reads movies after writing one."""
+        routes = []
+
+        def view(request):
+            routes.extend([router.db_for_read(Movie), router.db_for_read(User), router.db_for_write(Movie),
+                           router.db_for_read(Movie)])
+            return HttpResponse()
+        return routes, ReplicaMiddleware(view)(request)
+
+    def test_reads_after_write_stick_to_primary(self):
+        routes, response = self.route(RequestFactory().get('/'))
+        self.assertEqual(routes, ['replica', 'default', 'default', 'default'])
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+        routes, response = self.route(RequestFactory(HTTP_COOKIE='db_primary=1').get('/'))
+        self.assertEqual(routes[0], 'default')
+        routes, response = self.route(RequestFactory().post('/'))
+        self.assertEqual(routes[0], 'default')
+        self.assertEqual(router.db_for_read(Movie), 'default')
+
+    def test_replicate_db(self):
+        # a file of its own, the test database is inside a transaction the backup would wait for
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            source = sqlite3.connect(os.path.join(directory, 'primary.sqlite3'))
+            source.executescript('CREATE TABLE movie (id INTEGER); INSERT INTO movie VALUES (1), (2);')
+            for rows in (2, 3):
+                replicate_db.Command().copy(source, path)
+                replica = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+                self.assertEqual(replica.execute('SELECT COUNT(*) FROM movie').fetchone(), (rows,))
+                replica.close()
+                source.execute('INSERT INTO movie VALUES (3)')
+                source.commit()
+            source.close()
+
+
+@override_settings(SESSION_ENGINE='apps.sessions')
+class SessionWriteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_sessions_stay_in_cache(self):
+        session = sessions.SessionStore()
+        session['seen'] = True
+        session.save()
+        self.assertTrue(sessions.SessionStore(session.session_key)['seen'])
+        self.assertFalse(Session.objects.exists())
+
+    def test_login_writes_the_first_row(self):
+        User.objects.create_user('visitor', password='secret-1')
+        response = self.client.get('/login/?next=/profile/')
+        self.assertContains(response, 'name="next" value="/profile/"')
+        self.assertFalse(Session.objects.exists())
+
+        response = self.client.post('/login/', {'username': 'visitor', 'password': 'secret-1', 'next': '/profile/'})
+        self.assertRedirects(response, '/profile/', fetch_redirect_response=False)
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(self.client.get('/profile/').status_code, 200)
+
+
+class ServerTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_template_view(self):
+        with self.assertLogs('apps.timing', 'INFO') as logs:
+            response = self.client.get(f'/movies/{self.movie.id}/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+        self.assertIn('"status": 200', logs.output[0])
+
+    def test_api_view(self):
+        for url in ('/api/movies/', f'/api/movies/{self.movie.id}/'):
+            response = self.client.get(url)
+            self.assertIn('serializer;dur=', response['Server-Timing'])
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 1.0})
+    def test_header_off_by_default(self):
+        with self.assertLogs('apps.timing', 'INFO'):
+            response = self.client.get('/api/genres/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 0})
+    def test_unsampled(self):
+        self.assertFalse(self.client.get('/api/genres/').has_header('Server-Timing'))
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_catalog(movies=1)
+        cls.admin = User.objects.create_user('admin', is_staff=True)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        self.client.force_login(self.admin)
+        self.client.get(f'/api/movies/{self.movie.id}/')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'http_request_duration_seconds_count{view="api/movies/<int:id>/",method="GET"}')
+        self.assertContains(response, 'api_cache_lookups_total{result="miss"}')
+
+    def test_shared_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            worker = metrics.Registry()
+            worker.counter('test_total', 'Test').inc(2)
+            worker.write(directory)
+            os.rename(os.path.join(directory, f'{os.getpid()}.json'), os.path.join(directory, 'other.json'))
+            metrics.registry.counter('test_total', 'Test').inc(3)
+            self.addCleanup(metrics.registry.metrics.pop, 'test_total')
+            with override_settings(METRICS={'DIRECTORY': directory}):
+                self.assertIn('test_total 5\n', metrics.exposition())
+
+
+@override_settings(SLOW_QUERIES={'ENABLED': True, 'THRESHOLD_MS': 0})
+class SlowQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(movies=2)
+        for movie in Movie.objects.all():
+            Comment.objects.create(movie=movie, name='Name', text='Text')
+
+    def setUp(self):
+        slow_queries.clear()
+        self.addCleanup(slow_queries.clear)
+
+    def test_records_fingerprint_origin_and_plan(self):
+        with self.assertLogs('apps.slow_queries', 'WARNING'):
+            for movie in Movie.objects.all():
+                self.client.get(f'/movies/{movie.id}/')
+        entries = slow_queries.top()
+        comments = next(entry for entry in entries if 'FROM "apps_comment"' in entry['fingerprint'])
+        self.assertEqual(comments['count'], 2)
+        self.assertIn('apps/comments.py', comments['code'])
+        self.assertIn('apps/views.py', comments['code'])
+        self.assertIn('comment_movie_date_id_idx', comments['plan'])
+        # the sidebar genres are only fetched when the template renders
+        genres = next(entry for entry in entries if entry['fingerprint'].startswith('SELECT "apps_genre"'))
+        self.assertTrue(genres['template'].startswith('components/genres.html:'))
+
+    def test_admin_page(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        with self.assertLogs('apps.slow_queries', 'WARNING'):
+            self.client.get('/api/genres/')
+            response = self.client.get('/admin/slow-queries/')
+        self.assertContains(response, 'apps_genre')
@@ -0,0 +1,148 @@
+"""
+Resized JPEG and WebP derivatives of movie posters.
+
+Every width in ``POSTER_DERIVATIVES['WIDTHS']`` up to the width of the
+original is rendered in every format next to the original under
+``derivatives/``. The generator records the image name and the widths it
+rendered on the movies using the image (``image_derivatives`` and
+``inner_image_derivatives``), and srcsets are built from that record, so
+rendering a page never touches the storage. New uploads are queued on a thread
+pool once the saving transaction commits (see ``apps.signals``), and
+``manage.py generate_thumbnails`` (re)builds them for existing media.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from apps.models import Movie
+from apps.versions import bump_version
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WIDTHS': (200, 400, 800),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_executor = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POSTER_DERIVATIVES', {})}
+
+
+def derivative_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'derivatives/{root}_{width}w.{EXTENSIONS[fmt]}'
+
+
+def derivative_names(name):
+    config = get_config()
+    return [derivative_name(name, width, fmt) for fmt in config['FORMATS'] for width in config['WIDTHS']]
+
+
+def _encode(image, fmt, quality):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def generate(name, force=False):
+    """Render all derivatives of the stored image ``name``, returns how many were written."""
+    config = get_config()
+    with default_storage.open(name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+    # never upscale, wider variants of a small original are left out
+    widths = [width for width in config['WIDTHS'] if width <= image.width]
+    written = 0
+    for width in widths:
+        resized = image if image.width == width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS)
+        for fmt in config['FORMATS']:
+            target = derivative_name(name, width, fmt)
+            if default_storage.exists(target):
+                if not force:
+                    continue
+                default_storage.delete(target)
+            default_storage.save(target, _encode(resized, fmt, config['QUALITY']))
+            written += 1
+    record(name, widths)
+    return written
+
+
+def record(name, widths):
+    """Note the rendered ``widths`` on every movie whose image or inner image is ``name``."""
+    derivatives = {'name': name, 'widths': widths}
+    now = timezone.now()
+    updated = Movie.objects.filter(image=name).update(image_derivatives=derivatives, updated_at=now)
+    updated += Movie.objects.filter(inner_image=name).update(inner_image_derivatives=derivatives, updated_at=now)
+    if updated:
+        bump_version(Movie)
+
+
+def delete(name):
+    for derivative in derivative_names(name):
+        default_storage.delete(derivative)
+
+
+def _generate_logged(name):
+    try:
+        return generate(name)
+    except Exception:
+        logger.exception('Could not generate derivatives of %s', name)
+    finally:
+        # pool threads outlive any request, nothing else closes their connections
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=get_config()['WORKERS'], thread_name_prefix='thumbnails')
+    return _executor
+
+
+def is_recorded(file, derivatives):
+    return bool(file.name) and derivatives.get('name') == file.name
+
+
+def schedule(movie):
+    """Generate the derivatives ``movie`` has no record of, after the current transaction commits."""
+    names = {file.name for file, derivatives in ((movie.image, movie.image_derivatives),
+                                                 (movie.inner_image, movie.inner_image_derivatives))
+             if file.name and not is_recorded(file, derivatives)}
+    if not names:
+        return
+
+    def submit():
+        for name in names:
+            get_executor().submit(_generate_logged, name)
+    transaction.on_commit(submit)
+
+
+def variants(derivatives, fmt):
+    """``(url, width)`` of the derivatives in a record of ``generate``."""
+    if not derivatives:
+        return []
+    return [(default_storage.url(derivative_name(derivatives['name'], width, fmt)), width)
+            for width in derivatives['widths']]
+
+
+def srcset(derivatives, fmt):
+    return ', '.join(f'{url} {width}w' for url, width in variants(derivatives, fmt))
@@ -0,0 +1,164 @@
+"""
+Per-request timing: SQL, templates, serializers and the view.
+
+``ServerTimingMiddleware`` samples ``REQUEST_TIMING['SAMPLE_RATE']`` of the
+requests, counts and times their queries through ``execute_wrapper`` and
+reports the totals in a ``Server-Timing`` header and one JSON log line on the
+``apps.timing`` logger. Templates are timed by the ``TimedDjangoTemplates``
+backend, API responses by the ``TimedJSONRenderer`` renderer, and code like
+``api.values`` marks its own blocks with ``timed()``. Unsampled requests only pay
+for a random draw. The header shows query counts and timings to whoever sends
+the request, so it is off by default and ``SAMPLE_RATE`` defaults to 1%.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from rest_framework.renderers import JSONRenderer
+
+from apps.middleware import QueryHookMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.01,  # share of requests that are timed, 0 turns timing off
+    'HEADER': False,
+    'LOG': True,
+}
+
+_current = ContextVar('request_timer', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_TIMING', {})}
+
+
+class RequestTimer:
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self.running = set()
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.token = None
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', time.perf_counter() - started)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to ``name`` of the current request, nested blocks count once."""
+    timer = _current.get()
+    if timer is None or name in timer.running:
+        yield
+        return
+    timer.running.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+        timer.running.discard(name)
+
+
+class ServerTimingMiddleware(QueryHookMiddleware):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(self):
+            # an async stack would otherwise run the sync hook in a thread
+            self.process_view = self.aprocess_view
+
+    def start(self, request):
+        config = get_config()
+        if not config['SAMPLE_RATE'] or random.random() >= config['SAMPLE_RATE']:
+            return None
+        timer = RequestTimer()
+        timer.token = _current.set(timer)
+        return timer
+
+    def close(self, timer):
+        _current.reset(timer.token)
+
+    def finish(self, request, response, timer):
+        config = get_config()
+        finished = time.perf_counter()
+        if timer.view_started is not None:
+            timer.add('view', finished - timer.view_started)
+        timer.add('total', finished - timer.started)
+
+        if config['HEADER']:
+            response['Server-Timing'] = self.header(timer)
+        if config['LOG']:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timer.queries,
+                **{f'{name}_ms': round(duration * 1000, 2) for name, duration in timer.durations.items()},
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timer = _current.get()
+        if timer is not None:
+            timer.view_started = time.perf_counter()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ServerTimingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def header(self, timer):
+        entries = []
+        for name in ('db', 'template', 'serializer', 'view', 'total'):
+            if name in timer.durations or name == 'db':
+                entry = f'{name};dur={timer.durations.get(name, 0) * 1000:.1f}'
+                if name == 'db':
+                    entry += f';desc="{timer.queries} queries"'
+                entries.append(entry)
+        return ', '.join(entries)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with renders counted in request timing."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """DRF's JSON renderer, with rendering counted as serializer time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serializer'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('movies/<int:id>/', views.detail, name='detail'),
     path('movies/genre/<int:id>/', views.movies_by_genre, name='movies_by_genre'),
     path('ajax/create_comment/', views.create_comment_ajax, name='create_comment_ajax'),
+    path('ajax/movies/<int:id>/comments/', views.comments_feed, name='comments_feed'),
     path('login/', views.login_profile, name='login'),
     path('logout/', views.logout_profile, name='logout'),
     path('profile/', views.profile, name='profile'),
@@ -15,5 +16,7 @@ urlpatterns = [
 
     path('ajax/login/', views.login_ajax, name='login_ajax'),
     path('ajax/logout/', views.logout_ajax, name='logout_ajax'),
+
+    path('metrics/', views.metrics, name='metrics'),
 ]
  
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Per-model version counters kept in the cache and bumped by ``apps.signals``
+on every write, so caches keyed on them never need explicit purging.
+
+With more than one worker process ``MODEL_VERSIONS_CACHE`` must name a cache
+the workers share (file based, memcached, redis), otherwise each worker only
+sees its own bumps.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[getattr(settings, 'MODEL_VERSIONS_CACHE', 'default')]
+
+
+def version_key(model):
+    return f'model_version:{model._meta.label_lower}'
+
+
+def get_versions(*models):
+    cache = _cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start from the clock so an evicted counter never reuses an old value
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+async def aget_versions(*models):
+    cache = _cache()
+    keys = [version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return tuple(versions[key] for key in keys)
+
+
+def get_version(model):
+    return get_versions(model)[0]
+
+
+def bump_version(model):
+    cache = _cache()
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
@@ -2,19 +2,30 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseNotAllowed
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, HttpResponseForbidden, HttpResponseNotAllowed
+from django.utils.http import url_has_allowed_host_and_scheme
 
+from api import authentication
 from apps.models import Movie, Genre, Director, Comment
 from apps.filters import MovieFilter
 from apps.forms import LoginForm
+from apps.paginations import InvalidCursor, KeysetPaginator, MOVIE_ORDERINGS, page_size
+from apps.comments import comment_json, comments_page
 from apps.decorators import increase_views
+from apps.search import search_movies
+from apps.metrics import CONTENT_TYPE, exposition
+from apps import slow_queries as slow_query_log
 
 
 def main(request):
     search = request.GET.get('search', None)
     if search:
-        movies = Movie.objects.filter(name__icontains=search)
-        return render(request, 'search_page.html', { 'movies_list': movies,})
+        offset = request.GET.get('offset', 1)
+        limit = page_size(request.GET.get('limit'), 12)
+        paginator = Paginator(search_movies(search), limit)
+        movies = paginator.get_page(offset)
+        return render(request, 'search_page.html', { 'movies_list': movies, 'search': search,})
     else:
         movies = Movie.objects.all().order_by('-id')
     genre = request.GET.get('genre', None)
@@ -24,22 +35,34 @@ def main(request):
 
     filter_set = MovieFilter(request.GET, queryset=movies)
 
-    offset = request.GET.get('offset', 1)
-    limit = request.GET.get('limit', 2)
-    paginator = Paginator(filter_set.qs, limit)
-    movies = paginator.get_page(offset)
+    limit = page_size(request.GET.get('limit'), 2)
+    if 'offset' in request.GET:
+        paginator = Paginator(filter_set.qs, limit)
+        movies = paginator.get_page(request.GET.get('offset'))
+    else:
+        sort = request.GET.get('sort', 'new')
+        sort = sort if sort in MOVIE_ORDERINGS else 'new'
+        paginator = KeysetPaginator(filter_set.qs, limit, MOVIE_ORDERINGS[sort], name=sort)
+        movies = paginator.get_page(request.GET.get('cursor'))
     return render(request, 'index.html', { 'movies_list': movies, 'filter': filter_set})
 
 
 @increase_views
 def detail(request, id):
-    movie = get_object_or_404(Movie, id=id)
-    comments = Comment.objects.filter(movie=movie)
-    offset = request.GET.get('offset', 1)
-    limit = request.GET.get('limit', 3)
-    paginator = Paginator(comments, limit)
-    comments = paginator.get_page(offset)
+    movie = get_object_or_404(Movie.objects.select_related('director').prefetch_related('genres'), id=id)
+    comments = comments_page(movie.id, request.GET.get('limit', 3))
     return render(request, 'detail.html', {'movie': movie, 'comments': comments,})
+
+
+def comments_feed(request, id):
+    try:
+        comments = comments_page(id, request.GET.get('limit', 3), request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'message': 'Invalid cursor'}, status=400)
+    return JsonResponse({
+        'results': [comment_json(comment) for comment in comments],
+        'next': comments.next_cursor,
+    })
     
 
 
@@ -61,22 +84,17 @@ def create_comment_ajax(request):
         text=text,
     )
 
-    return JsonResponse({
-        'id': new_comment.id,
-        'movie': new_comment.movie.id,
-        'name': new_comment.name,
-        'text': new_comment.text,
-        'date': new_comment.date.strftime('%d %B %Y')
-    })
+    return JsonResponse({**comment_json(new_comment), 'movie': movie.id})
 
 
 def login_profile(request):
     if request.user.is_authenticated:
         return redirect('/')
     form = LoginForm()
-    if request.session.get('next_link', None) is None:
-        request.session.modified = True
-        request.session['next_link'] = request.GET.get('next') or '/'
+    # the form carries it back, so showing the page writes no session
+    next_link = request.POST.get('next') or request.GET.get('next') or '/'
+    if not url_has_allowed_host_and_scheme(next_link, {request.get_host()}, request.is_secure()):
+        next_link = '/'
 
     if request.method == 'POST':
         form = LoginForm(request.POST)
@@ -86,12 +104,11 @@ def login_profile(request):
             user = authenticate(username=username, password=password)
             if user:
                 login(request, user)
-                next_link = request.session['next_link']
                 return redirect(next_link)
             return render(request, 'auth/login.html', {
                 'message': 'The user is not found or invalid password',
-                'form': form})
-    return render(request, 'auth/login.html', {'form': form})
+                'form': form, 'next': next_link})
+    return render(request, 'auth/login.html', {'form': form, 'next': next_link})
 
 
 def logout_profile(request):
@@ -152,6 +169,7 @@ def change_password(request):
             
             user.set_password(new_password)
             user.save()
+            authentication.invalidate_user(user.pk)
             login(request, user)
             return redirect('/profile/')
         
@@ -186,4 +204,25 @@ def logout_ajax(request):
     return JsonResponse({'isLogout': True}, status=200)
 
 
-    
\ No newline at end of file
+    
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+@staff_member_required
+def slow_queries(request):
+    if request.method == 'POST':
+        slow_query_log.clear()
+        return redirect('slow_queries')
+    order_by = request.GET.get('o', 'total_ms')
+    if order_by not in ('total_ms', 'max_ms', 'count', 'last_seen'):
+        order_by = 'total_ms'
+    return render(request, 'admin/slow_queries.html', {
+        'entries': slow_query_log.top(order_by),
+        'order_by': order_by,
+        'config': slow_query_log.get_config(),
+        'title': 'Slow queries',
+    })
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+# serve the read API from its async views, see api/async_views.py
+os.environ.setdefault('API_ASYNC_READS', '1')
 
 application = get_asgi_application()
@@ -47,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.MetricsMiddleware',
+    'apps.timing.ServerTimingMiddleware',
+    'apps.slow_queries.SlowQueryMiddleware',
+    'apps.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +64,7 @@ ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'apps.timing.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
@@ -89,6 +93,25 @@ DATABASES = {
     }
 }
 
+# Read replicas, see apps/routers.py. DATABASE_REPLICAS lists SQLite files
+# (comma separated) opened read-only and refreshed from the primary by
+# ``manage.py replicate_db``.
+DATABASE_REPLICAS = [path for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path]
+for number, path in enumerate(DATABASE_REPLICAS, start=1):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': Path(path).absolute().as_uri() + '?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['apps.routers.ReplicaRouter']
+DATABASE_ROUTING = {
+    'REPLICAS': [f'replica_{number}' for number in range(1, len(DATABASE_REPLICAS) + 1)],
+    'APPS': ('apps',),
+    'STICKY_SECONDS': 10,  # longer than the replication interval
+    'COOKIE_NAME': 'db_primary',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -143,13 +166,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer, timed for the Server-Timing header
+        'apps.timing.TimedJSONRenderer',
         # 'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -157,3 +181,86 @@ REST_FRAMEWORK = {
     ]
 
 }
+
+
+# Verified Basic credentials and tokens are remembered this many seconds (0
+# turns it off), see api/authentication.py. Basic entries live in ALIAS, which
+# should be shared by the workers like MODEL_VERSIONS_CACHE.
+API_AUTH_CACHE = {
+    'BASIC_TTL': 60,
+    'TOKEN_TTL': 60,
+}
+
+
+# Movie views are buffered and written back in batches, see apps/counters.py.
+# Set CACHE_ALIAS to a cache shared by all workers (file based, redis, ...)
+# so that ``manage.py flush_views`` can flush every worker's buffer.
+VIEW_COUNTER = {
+    'FLUSH_INTERVAL': 10,  # seconds
+    'CACHE_ALIAS': None,
+}
+
+
+# Local memory is fine for a single process. For several workers switch to a
+# shared cache, e.g.
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache',
+# so that model version bumps (apps/versions.py) reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+MODEL_VERSIONS_CACHE = 'default'
+
+# Sessions are read through the cache, and only those of logged in users are
+# written to the database, see apps/sessions.py. SESSION_CACHE_ALIAS must be
+# shared by the workers too.
+SESSION_ENGINE = 'apps.sessions'
+SESSION_CACHE_ALIAS = 'default'
+
+# Read API response cache, see api/cache.py
+API_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,  # seconds
+}
+
+# Resized poster variants, see apps/thumbnails.py
+POSTER_DERIVATIVES = {
+    'WIDTHS': (200, 400, 800),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+}
+
+# Largest list accepted by the batch write endpoints, see api/batch.py
+API_BATCH_MAX_SIZE = 500
+
+# Serve the read API from the async views of api/async_views.py. On by default
+# under ASGI (project/asgi.py); under WSGI every async view would need its own
+# event loop, so leave it off there.
+API_ASYNC_READS = os.environ.get('API_ASYNC_READS', '0') == '1'
+
+# Server-Timing header and JSON log line per sampled request, see apps/timing.py.
+# The lines go to the "apps.timing" logger at INFO, route it in LOGGING to keep them.
+REQUEST_TIMING = {
+    'SAMPLE_RATE': 1.0 if DEBUG else 0.01,
+    'HEADER': DEBUG,  # exposes query counts and timings to every client
+    'LOG': True,
+}
+
+# Prometheus metrics at /metrics/ (staff only), see apps/metrics.py. With
+# several worker processes set DIRECTORY to a path they all share.
+METRICS = {
+    'DIRECTORY': None,
+    'WRITE_INTERVAL': 5,  # seconds
+}
+
+# Slow query recorder, listed at /admin/slow-queries/, see apps/slow_queries.py
+SLOW_QUERIES = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'BUFFER_SIZE': 200,
+    'EXPLAIN': True,
+}
@@ -16,11 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from apps.views import main, detail, movies_by_genre, create_comment_ajax, login_profile, logout_profile
+from apps.views import main, detail, movies_by_genre, create_comment_ajax, login_profile, logout_profile, slow_queries
 from django.conf.urls.static import static
 from django.conf import settings
 
 urlpatterns = [
+    path('admin/slow-queries/', slow_queries, name='slow_queries'),
     path('admin/', admin.site.urls, name='admin'),
     path('', include('apps.urls')),
     path('workspace/', include('workspace.urls')),
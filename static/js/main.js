@@ -13,6 +13,30 @@ if (genres_card){
     })
 }
 
+const commentContainer = document.querySelector('#commentContainer')
+
+const renderComment = comment => {
+    const block = document.createElement('div')
+    block.className = 'p-2 mt-3 rounded-xl text-slate-800 bg-white'
+    block.id = `comment_block_${comment.id}`
+    block.innerHTML = `
+        <div class="flex justify-between">
+            <div class="comment-name"></div>
+            <div class="text-muted text-end comment-date"></div>
+        </div>
+        <p class="comment-text"></p>`
+    block.querySelector('.comment-name').textContent = comment.name
+    block.querySelector('.comment-date').textContent = comment.date
+    block.querySelector('.comment-text').textContent = comment.text
+    if (commentContainer.dataset.deletable) {
+        block.insertAdjacentHTML('beforeend', `
+        <div class="text-end">
+            <button class="bg-amber-400 rounded-xl text-black addCommentBtn" onclick="deleteComment(${comment.id})">Delete</button>
+        </div>`)
+    }
+    return block
+}
+
 const createCommentVar = document.forms.createComment
 if (createCommentVar) {
 createCommentVar.addEventListener('submit', e => {
@@ -35,24 +59,33 @@ createCommentVar.addEventListener('submit', e => {
     )
     .then(res => res.json())
     .then(res => {
-        const commentContainer = document.querySelector('#commentContainer')
-        commentContainer.innerHTML = `
-                <div class="p-2 mt-3 rounded-xl text-slate-800 bg-white" id="comment_block_${res.id}">
-                    <div class="flex justify-between">
-                        <div class="">${res.name}</div>
-                        <div class="text-muted text-end">${res.date}</div>
-                    </div>
-                    <p class="">${res.text}</p>
-                    <div class="text-end">
-                        <button class="bg-amber-400 rounded-xl text-black addCommentBtn" onclick="deleteComment(${res.id})">Delete</button>
-                    </div>
-                </div>
-        ` + commentContainer.innerHTML
+        // the feed is newest first, so the new comment goes on top and later pages are unaffected
+        commentContainer.prepend(renderComment(res))
+        const count = document.querySelector('#commentCount')
+        if (count) count.textContent = +count.textContent + 1
+        form.reset()
     })
     .finally(res => btn.innerHTML = 'Add this comment')
 })
 }
 
+const loadMoreComments = document.querySelector('#loadMoreComments')
+if (loadMoreComments) {
+loadMoreComments.addEventListener('click', async () => {
+    const params = new URLSearchParams({cursor: loadMoreComments.dataset.next})
+    loadMoreComments.disabled = true
+    const res = await fetch(`${commentContainer.dataset.feed}?${params}`, {headers: {'Accept': 'application/json'}})
+    loadMoreComments.disabled = false
+    if (res.status != 200) return alert('Network error')
+    const data = await res.json()
+    for (const comment of data.results) {
+        if (!document.getElementById(`comment_block_${comment.id}`)) commentContainer.append(renderComment(comment))
+    }
+    if (data.next) loadMoreComments.dataset.next = data.next
+    else loadMoreComments.remove()
+})
+}
+
 const deleteComment = async (commentId) => {
 
   const res = await fetch(`/workspace/ajax/comments/${commentId}/delete/`)
@@ -1,10 +1,12 @@
-from django.core.files.storage import FileSystemStorage
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator
-from django.utils import timezone
 from django.http import JsonResponse, HttpResponseForbidden
 
 from apps.models import Movie, Genre, Director, Comment
+from apps.catalog import genre_catalog
+from apps.forms import MovieForm
+from apps.paginations import KeysetPaginator, MOVIE_ORDERINGS, page_size
+from apps.comments import comments_page
 from workspace.decorators import required_login_custom
 
 
@@ -15,23 +17,24 @@ def workspace(request):
     if genre:
         genre = get_object_or_404(Genre, id=int(genre))
         movies = movies.filter(genres=genre)
-    genres = Genre.objects.all()
-    offset = request.GET.get('offset', 1)
-    limit = request.GET.get('limit', 2)
-    paginator = Paginator(movies, limit)
-    movies = paginator.get_page(offset)
+    genres = genre_catalog.all()
+    limit = page_size(request.GET.get('limit'), 2)
+    if 'offset' in request.GET:
+        paginator = Paginator(movies, limit)
+        movies = paginator.get_page(request.GET.get('offset'))
+    else:
+        sort = request.GET.get('sort', 'new')
+        sort = sort if sort in MOVIE_ORDERINGS else 'new'
+        paginator = KeysetPaginator(movies, limit, MOVIE_ORDERINGS[sort], name=sort)
+        movies = paginator.get_page(request.GET.get('cursor'))
     return render(request, 'workspace/index.html', {'movies_list': movies, 'genres': genres})
     
     
 @required_login_custom
 def detail_movie(request, id):
-    movie = get_object_or_404(Movie, id=id)
-    comments = Comment.objects.filter(movie=movie)
-    offset = request.GET.get('offset', 1)
-    limit = request.GET.get('limit', 3)
-    paginator = Paginator(comments, limit)
-    comments = paginator.get_page(offset)
-    genres = Genre.objects.all()
+    movie = get_object_or_404(Movie.objects.select_related('director').prefetch_related('genres'), id=id)
+    comments = comments_page(movie.id, request.GET.get('limit', 3))
+    genres = genre_catalog.all()
     return render(request, 'workspace/detail.html', {'movie': movie, 'comments': comments, 'genres': genres})
 
 
@@ -39,38 +42,25 @@ def detail_movie(request, id):
 def update_movie(request, id):
     movie = get_object_or_404(Movie, id=id)
     if request.method == 'POST':
-        movie.name = request.POST.get('name')
-        movie.overview = request.POST.get('overview')
-        movie.rating = request.POST.get('rating')
-        movie.year = request.POST.get('year')
-        movie.director = Director.objects.get(id=int(request.POST.get('director')))
+        form = MovieForm(request.POST, instance=movie)
+        if not form.is_valid():
+            return JsonResponse({'message': 'Invalid movie', 'errors': form.errors}, status=400)
+        movie = form.save(commit=False)
 
         image = request.FILES.get('image')
         inner_image = request.FILES.get('inner_image')
-        genres = Genre.objects.filter(id__in=list(map(int, request.POST.getlist('genres'))))
-
-        for genre in movie.genres.all():
-            movie.genres.remove(genre)
-
-        for genre in genres:
-            movie.genres.add(genre)
 
         if image:
-            movieImageSystem = FileSystemStorage('media/images/')
-            movieImageSystem.delete(movie.image.name)
-            movieImageSystem.save(image.name, image)
             movie.image = image
 
         if inner_image:
-            movieImageSystem1 = FileSystemStorage('media/inner_images/')
-            movieImageSystem1.delete(movie.inner_image.name)
-            movieImageSystem1.save(inner_image.name, inner_image)
             movie.inner_image = inner_image
         
         movie.save()
+        form.save_m2m()
         return redirect(f'/workspace/movies/{movie.id}')
     
-    genres = Genre.objects.all()
+    genres = genre_catalog.all()
     directors = Director.objects.all()
     return render(request, 'workspace/edit_movie.html', {
         'movie': movie,
@@ -82,38 +72,18 @@ def update_movie(request, id):
 @required_login_custom
 def add_movie(request):
     if request.method == 'POST':
-        name = request.POST.get('name')
-        overview = request.POST.get('overview')
-        date = timezone.now()
-        genres = Genre.objects.filter(id__in=list(map(int, request.POST.getlist('genres'))))
-        rating = request.POST.get('rating')
-        director = Director.objects.get(id=int(request.POST.get('director')))
-        year = request.POST.get('year')
-        image = request.FILES.get('image')
-        inner_image = request.FILES.get('inner_image')
-
-        movieImageSystem = FileSystemStorage('media/images')
-        movieImageSystem.save(image.name, image)
-        movieImageSystem2 = FileSystemStorage('media/inner_images')
-        movieImageSystem2.save(inner_image.name, inner_image)
-
-        movie = Movie.objects.create(
-            name=name,
-            overview=overview,
-            director=director,
-            year=year,
-            rating=rating,
-            image=image,
-            inner_image=inner_image,
-        )
-
-        for genre in genres:
-            movie.genres.add(genre)
-    
+        form = MovieForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'message': 'Invalid movie', 'errors': form.errors}, status=400)
+        movie = form.save(commit=False)
+        movie.image = request.FILES.get('image')
+        movie.inner_image = request.FILES.get('inner_image')
+        movie.save()
+        form.save_m2m()
 
         return redirect('/workspace/')
 
-    genres = Genre.objects.all()
+    genres = genre_catalog.all()
     directors = Director.objects.all()
     return render(request, 'workspace/add_movie.html', {
         'genres': genres,
@@ -132,7 +102,7 @@ def delete_movie(request, id):
 def list_of_genres(request):
     genres = Genre.objects.all().order_by('-id')
     offset = request.GET.get('offset', 1)
-    limit = request.GET.get('limit', 2)
+    limit = page_size(request.GET.get('limit'), 2)
     paginator = Paginator(genres, limit)
     genres = paginator.get_page(offset)
     return render(request, 'workspace/genres.html', {'genres': genres})